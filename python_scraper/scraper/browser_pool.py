@@ -0,0 +1,115 @@
+import atexit
+import os
+from collections import deque
+from contextlib import contextmanager
+from typing import Optional
+
+from playwright.sync_api import Browser, Page, sync_playwright
+
+
+def browserbase_url() -> str:
+    return f"wss://connect.browserbase.com?apiKey={os.environ['BROWSERBASE_API_KEY']}"
+
+
+class BrowserPool:
+    """Keeps up to ``size`` remote browser sessions connected and lends out
+    their pages, so each URL reuses a warm session instead of paying the
+    full CDP connect for every call.
+
+    Playwright's sync API is bound to the thread that started it, so a pool
+    must only be used from that thread.
+    """
+
+    def __init__(self, size: int = 2, connect_url: Optional[str] = None):
+        self.size = size
+        self.connect_url = connect_url
+        self._playwright = None
+        self._idle: deque[tuple[Browser, Page]] = deque()
+        self._open = 0
+
+    def _connect(self) -> tuple[Browser, Page]:
+        if self._playwright is None:
+            self._playwright = sync_playwright().start()
+        browser = self._playwright.chromium.connect_over_cdp(
+            self.connect_url or browserbase_url()
+        )
+        context = browser.contexts[0] if browser.contexts else browser.new_context()
+        page = context.pages[0] if context.pages else context.new_page()
+        self._open += 1
+        return browser, page
+
+    def _discard(self, browser: Browser) -> None:
+        self._open -= 1
+        try:
+            browser.close()
+        except Exception:
+            pass
+
+    def warm(self) -> None:
+        """Connect sessions up front until ``size`` are idle."""
+        while self._open < self.size:
+            self._idle.append(self._connect())
+
+    @staticmethod
+    def is_healthy(browser: Browser, page: Page) -> bool:
+        if not browser.is_connected() or page.is_closed():
+            return False
+        try:
+            return page.evaluate("1") == 1
+        except Exception:
+            return False
+
+    def _acquire(self) -> tuple[Browser, Page]:
+        while self._idle:
+            browser, page = self._idle.popleft()
+            if self.is_healthy(browser, page):
+                return browser, page
+            print("Dropping dead browser session, reconnecting")
+            self._discard(browser)
+        return self._connect()
+
+    @contextmanager
+    def page(self):
+        browser, page = self._acquire()
+        try:
+            yield page
+        except Exception:
+            # Don't hand a session that just failed to the next caller
+            # without checking it first.
+            if not self.is_healthy(browser, page):
+                self._discard(browser)
+                raise
+            self._release(browser, page)
+            raise
+        self._release(browser, page)
+
+    def _release(self, browser: Browser, page: Page) -> None:
+        if self._open > self.size:
+            self._discard(browser)
+        else:
+            self._idle.append((browser, page))
+
+    def close(self) -> None:
+        while self._idle:
+            browser, _ = self._idle.popleft()
+            self._discard(browser)
+        if self._playwright is not None:
+            self._playwright.stop()
+            self._playwright = None
+
+    def __enter__(self) -> "BrowserPool":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+_default_pool: Optional[BrowserPool] = None
+
+
+def default_pool() -> BrowserPool:
+    global _default_pool
+    if _default_pool is None:
+        _default_pool = BrowserPool(size=int(os.getenv("BROWSER_POOL_SIZE", "2")))
+        atexit.register(_default_pool.close)
+    return _default_pool
@@ -1,21 +1,33 @@
+import argparse
+import asyncio
 import code
 import json
 import os
 import tempfile
 import time
-from typing import Dict, List
+from typing import Dict, List, Optional
 
 from dotenv import load_dotenv
-from scraper.scrape import get_data_links, get_page_text, take_full_page_screenshot
+from scraper.pipeline import run_async_pipeline
+from scraper.scrape import (
+    get_data_links,
+    get_page_text,
+    get_page_title,
+    take_full_page_screenshot,
+)
+from scraper.utils.journal import IngestJournal
 from scraper.utils.llm import LLMClient
-from scraper.utils.supabase_client import SupabaseClient
+from scraper.utils.profiler import embedding_text, profile_entries
+from scraper.utils.supabase_client import BatchWriter, SupabaseClient
 from scraper.utils.utils import download_file
-from scraper.utils.vectorizer import get_embedding
+from scraper.utils.vectorizer import get_embedding, get_embeddings
 
 load_dotenv()
 
 
 class DataPageProcessor:
+    table_name = "sf_csv_data_duplicate"
+
     def __init__(self):
         self.llm_client = LLMClient()
         self.supabase_client = SupabaseClient()
@@ -64,13 +76,16 @@ class DataPageProcessor:
         download_links = get_data_links(url)
         print(f"Found download links: {len(download_links)} links")
 
+        # Links are ranked against the dataset name, not the page's first line
+        page_title = get_page_title(url)
+
         # Get page analysis from LLM using text
         page_analysis = self.llm_client.get_text_response_and_download_link(
-            page_text, download_links
+            page_text, download_links, title=page_title
         )
         print(f"Received LLM analysis with title: {page_analysis.title}")
 
-        primary_data_link = page_analysis.primary_data_link.LINK_0.value
+        primary_data_link = page_analysis.primary_data_link
         print(f"Primary data link: {primary_data_link}")
 
         title_embedding = get_embedding(page_analysis.title)
@@ -104,6 +119,7 @@ class DataPageProcessor:
         pre_extracted_title: str,
         page_text: str,
         id: str,
+        writer: Optional[BatchWriter] = None,
     ) -> None:
         print(f"\nProcessing URL: {url}")
 
@@ -117,9 +133,9 @@ class DataPageProcessor:
 
         title_embedding = get_embedding(pre_extracted_title)
         description_embedding = get_embedding(page_analysis.description)
-        # file_content, file_extension = download_file(download_link)
-        # full_csv_path = self.supabase_client.upload_csv_to_bucket(
-        #     "data", file_content, "csv", file_extension, pre_extracted_title
+        # file_path, file_extension = download_file(download_link)
+        # full_csv_path = self.supabase_client.upload_file_to_bucket(
+        #     "data", file_path, "csv", pre_extracted_title
         # )
         page_data = {
             "title": pre_extracted_title,
@@ -134,9 +150,117 @@ class DataPageProcessor:
         }
 
         print("Prepared data for Supabase upload")
-        self.supabase_client.upsert_embeddings("sf_csv_data_duplicate", [page_data])
+        if writer is not None:
+            writer.add(page_data)
+            return
+        self.supabase_client.upsert_embeddings(self.table_name, [page_data])
         print("Uploaded data to Supabase")
 
+    @staticmethod
+    def page_row(
+        entry: Dict,
+        page_analysis,
+        title_embedding: List[float],
+        description_embedding: List[float],
+    ) -> Dict:
+        return {
+            "title": entry["title"],
+            "llm_enhanced_title": page_analysis.title,
+            "description": page_analysis.description,
+            "csv_url": entry["downloadUrl"],
+            "description_vector": description_embedding,
+            "title_vector": title_embedding,
+            "url": entry["url"],
+            "id": entry["id"],
+        }
+
+    def process_batch_with_preprocessed_data(
+        self,
+        entries: List[Dict],
+        writer: Optional[BatchWriter] = None,
+        packed: bool = False,
+    ) -> tuple[List[Dict], List[Dict]]:
+        # LLM analysis is per page (or several pages per request when
+        # packed), and all titles and descriptions of the batch share a
+        # handful of embedding requests and one upsert.
+        analysed = []
+        errors = []
+        if packed:
+            results, failures = self.llm_client.get_text_responses_packed(entries)
+            for entry in entries:
+                if entry["id"] in results:
+                    analysed.append((entry, results[entry["id"]]))
+                else:
+                    errors.append(
+                        {
+                            "id": entry["id"],
+                            "url": entry["url"],
+                            "error": failures.get(entry["id"], "No response"),
+                        }
+                    )
+            rows, embed_errors = self.upload_analysed(analysed, writer)
+            return rows, errors + embed_errors
+
+        for entry in entries:
+            print(f"\nProcessing URL: {entry['url']}")
+            try:
+                page_analysis = self.llm_client.get_text_response(
+                    entry["text"], entry.get("schema")
+                )
+                print(f"Received LLM analysis with title: {page_analysis.title}")
+                analysed.append((entry, page_analysis))
+            except Exception as e:
+                print(f"Error processing {entry['title']}: {str(e)}")
+                errors.append({"id": entry["id"], "url": entry["url"], "error": str(e)})
+
+        rows, embed_errors = self.upload_analysed(analysed, writer)
+        return rows, errors + embed_errors
+
+    def upload_analysed(
+        self, analysed: List[tuple], writer: Optional[BatchWriter] = None
+    ) -> tuple[List[Dict], List[Dict]]:
+        """Embed and upload ``(entry, page_analysis)`` pairs.
+
+        Returns the uploaded rows and an error for each entry with an empty
+        title or description, which is left out rather than failing the batch.
+        """
+        if not analysed:
+            return [], []
+
+        texts = [entry["title"] for entry, _ in analysed] + [
+            embedding_text(page_analysis.description, entry.get("columns"))
+            for entry, page_analysis in analysed
+        ]
+        embeddings = get_embeddings(texts)
+        title_embeddings = embeddings[: len(analysed)]
+        description_embeddings = embeddings[len(analysed) :]
+
+        rows, errors = [], []
+        for (entry, page_analysis), title_embedding, description_embedding in zip(
+            analysed, title_embeddings, description_embeddings
+        ):
+            if title_embedding is None or description_embedding is None:
+                errors.append(
+                    {
+                        "id": entry["id"],
+                        "url": entry["url"],
+                        "error": "Empty title or description to embed",
+                    }
+                )
+                continue
+            rows.append(
+                self.page_row(
+                    entry, page_analysis, title_embedding, description_embedding
+                )
+            )
+
+        if writer is not None:
+            writer.add_many(rows)
+        else:
+            self.supabase_client.upsert_embeddings(self.table_name, rows)
+            print(f"Uploaded {len(rows)} rows to Supabase")
+        return rows, errors
+
     def process_with_preprocessed_data_local(
         self, url: str, download_link: str, pre_extracted_title: str, page_text: str
     ) -> None:
@@ -181,7 +305,7 @@ class DataPageProcessor:
         print("Upsert completed")
 
 
-def main():
+def main(pipeline: str = "sync", concurrency: int = 16, profile: bool = False):
     processor = DataPageProcessor()
     url = "https://data.sfgov.org/Public-Safety/Fire-Incidents/wr8u-xric/about_data"
     json_file_path = "scraper/download_links.json"
@@ -194,30 +318,127 @@ def main():
         with open(checkpoint_file, "r") as f:
             all_data_links.extend(json.load(f))
 
-    data_links = all_data_links
-    # Process each entry
-    errors = []
-    uploaded_data = []
-    for entry in data_links:
-        try:
-            page_data = processor.process_with_preprocessed_data(
-                url=entry["url"],
-                download_link=entry["downloadUrl"],
-                pre_extracted_title=entry["title"],
-                page_text=entry["text"],
-                id=entry["id"],
+    # Each checkpoint holds the whole URL list, so one dataset shows up in
+    # several; keep a copy that has page text where there is one
+    by_id: Dict[str, Dict] = {}
+    for entry in all_data_links:
+        if entry.get("text") or entry["id"] not in by_id:
+            by_id[entry["id"]] = entry
+    all_data_links = list(by_id.values())
+
+    # Everything already committed by an earlier (possibly crashed) run is
+    # skipped; rows and failures are journaled as they happen.
+    journal = IngestJournal("ingest_journal.jsonl", results_path="uploaded_data.jsonl")
+    data_links = journal.pending(all_data_links)
+    print(
+        f"{len(all_data_links) - len(data_links)} datasets already ingested, "
+        f"{len(data_links)} to go"
+    )
+
+    # Checkpoints list every URL, including ones not crawled yet
+    missing_text = [entry for entry in data_links if not entry.get("text")]
+    data_links = [entry for entry in data_links if entry.get("text")]
+
+    # Learn which lines are shared boilerplate before any prompt is built.
+    # Fitting on every crawled page, not just the pending ones, keeps the
+    # prompts of a partial re-ingest the same as in the full run.
+    processor.llm_client.compactor.fit(
+        entry["text"] for entry in all_data_links if entry.get("text")
+    )
+
+    if profile:
+        # Column summaries from the head of each rows.csv, for the prompt and
+        # the description embedding
+        profile_entries(data_links)
+
+    def record_error(error: Dict) -> None:
+        journal.failed(error["id"], error["url"], error["error"])
+
+    with journal:
+        for entry in missing_text:
+            print(f"No page text for {entry['url']}, skipping")
+            journal.failed(entry["id"], entry["url"], "No page text in checkpoint")
+
+        if pipeline == "async":
+            uploaded, failed = asyncio.run(
+                run_async_pipeline(
+                    processor,
+                    data_links,
+                    llm_concurrency=concurrency,
+                    on_uploaded=journal.committed,
+                    on_error=record_error,
+                )
             )
-            uploaded_data.append(page_data)
-        except Exception as e:
-            print(f"Error processing {entry['title']}: {str(e)}")
-            errors.append({"url": entry["url"], "error": str(e)})
-
-    with open("errors.json", "w") as f:
-        json.dump(errors, f)
-
-    with open("uploaded_data.json", "w") as f:
-        json.dump(uploaded_data, f)
+            print(f"Uploaded {uploaded} rows, {failed} errors")
+            print(f"Prompt compaction: {processor.llm_client.compactor.stats()}")
+            print(f"LLM response cache: {processor.llm_client.cache.stats()}")
+            print(f"Model tiers: {processor.llm_client.cascade_stats()}")
+            return
+
+        # Process entries in batches so embeddings and upserts are shared
+        batch_size = 128
+        writer = processor.supabase_client.batch_writer(
+            processor.table_name,
+            on_flush=journal.committed,
+            on_error=lambda row, error: journal.failed(row["id"], row["url"], error),
+        )
+        if pipeline == "batch":
+            # One Batch API job for every page's analysis, then embed/upload
+            results, errors = processor.llm_client.batch_text_responses(data_links)
+            for entry in data_links:
+                if entry["id"] in errors:
+                    journal.failed(entry["id"], entry["url"], errors[entry["id"]])
+            analysed = [
+                (entry, results[entry["id"]])
+                for entry in data_links
+                if entry["id"] in results
+            ]
+            with writer:
+                for start in range(0, len(analysed), batch_size):
+                    try:
+                        _, upload_errors = processor.upload_analysed(
+                            analysed[start : start + batch_size], writer=writer
+                        )
+                        for error in upload_errors:
+                            record_error(error)
+                    except Exception as e:
+                        print(f"Error uploading batch starting at {start}: {str(e)}")
+                        for entry, _ in analysed[start : start + batch_size]:
+                            journal.failed(entry["id"], entry["url"], str(e))
+            print(f"Uploaded {writer.written} rows, {len(journal.failures)} errors")
+            return
+
+        with writer:
+            for start in range(0, len(data_links), batch_size):
+                batch = data_links[start : start + batch_size]
+                try:
+                    _, batch_errors = processor.process_batch_with_preprocessed_data(
+                        batch, writer=writer, packed=pipeline == "packed"
+                    )
+                    for error in batch_errors:
+                        record_error(error)
+                except Exception as e:
+                    print(f"Error processing batch starting at {start}: {str(e)}")
+                    for entry in batch:
+                        journal.failed(entry["id"], entry["url"], str(e))
+        print(f"Uploaded {writer.written} rows, {len(journal.failures)} errors")
+        print(f"Prompt compaction: {processor.llm_client.compactor.stats()}")
+        print(f"LLM response cache: {processor.llm_client.cache.stats()}")
+        print(f"Model tiers: {processor.llm_client.cascade_stats()}")
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--pipeline",
+        choices=["sync", "async", "batch", "packed"],
+        default="sync",
+    )
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Sample each dataset's first rows and add a column summary",
+    )
+    args = parser.parse_args()
+    main(pipeline=args.pipeline, concurrency=args.concurrency, profile=args.profile)
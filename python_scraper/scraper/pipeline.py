@@ -0,0 +1,152 @@
+import asyncio
+from typing import Callable, Dict, List, Optional
+
+from scraper.utils.profiler import embedding_text
+from scraper.utils.vectorizer import aget_embeddings
+
+_DONE = object()
+
+
+async def _drain_batch(
+    queue: asyncio.Queue, first, batch_size: int, flush_interval: float
+):
+    """Collect up to ``batch_size`` items, waiting at most ``flush_interval``
+    seconds for each one after the first. Returns the batch and whether the
+    end-of-stream marker was seen."""
+    batch = [first]
+    while len(batch) < batch_size:
+        try:
+            item = await asyncio.wait_for(queue.get(), flush_interval)
+        except asyncio.TimeoutError:
+            break
+        if item is _DONE:
+            return batch, True
+        batch.append(item)
+    return batch, False
+
+
+async def run_async_pipeline(
+    processor,
+    entries: List[Dict],
+    llm_concurrency: int = 16,
+    embed_concurrency: int = 2,
+    upsert_concurrency: int = 4,
+    embed_batch_size: int = 64,
+    flush_interval: float = 2.0,
+    queue_size: int = 256,
+    on_uploaded: Optional[Callable[[List[Dict]], None]] = None,
+    on_error: Optional[Callable[[Dict], None]] = None,
+) -> tuple[int, int]:
+    """Ingest checkpoint entries through three overlapping stages.
+
+    LLM analysis -> batched embedding -> upsert, connected by bounded queues.
+    Each stage runs a fixed number of workers, so at most ``llm_concurrency``
+    OpenAI calls are in flight while earlier records are being embedded and
+    written. Uploaded rows and per-record errors are handed to the callbacks
+    as they happen; the return value is their counts.
+    """
+    pending: asyncio.Queue = asyncio.Queue()
+    analysed: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+    ready: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+    counts = {"uploaded": 0, "errors": 0}
+
+    def report_error(item: Dict, error: Exception) -> None:
+        counts["errors"] += 1
+        if on_error:
+            on_error({"id": item["id"], "url": item["url"], "error": str(error)})
+
+    for entry in entries:
+        pending.put_nowait(entry)
+
+    async def llm_worker():
+        while not pending.empty():
+            entry = pending.get_nowait()
+            try:
+                page_analysis = await processor.llm_client.aget_text_response(
+                    entry["text"], entry.get("schema")
+                )
+                print(f"Received LLM analysis with title: {page_analysis.title}")
+                await analysed.put((entry, page_analysis))
+            except Exception as e:
+                print(f"Error processing {entry['title']}: {str(e)}")
+                report_error(entry, e)
+
+    async def embed_worker():
+        done = False
+        while not done:
+            item = await analysed.get()
+            if item is _DONE:
+                break
+            batch, done = await _drain_batch(
+                analysed, item, embed_batch_size, flush_interval
+            )
+            try:
+                embeddings = await aget_embeddings(
+                    [entry["title"] for entry, _ in batch]
+                    + [
+                        embedding_text(page_analysis.description, entry.get("columns"))
+                        for entry, page_analysis in batch
+                    ]
+                )
+            except Exception as e:
+                print(f"Error embedding batch of {len(batch)}: {str(e)}")
+                for entry, _ in batch:
+                    report_error(entry, e)
+                continue
+            for i, (entry, page_analysis) in enumerate(batch):
+                title_embedding = embeddings[i]
+                description_embedding = embeddings[len(batch) + i]
+                # Blank texts are not embedded; only their entry fails
+                if title_embedding is None or description_embedding is None:
+                    report_error(
+                        entry, ValueError("Empty title or description to embed")
+                    )
+                    continue
+                await ready.put(
+                    processor.page_row(
+                        entry, page_analysis, title_embedding, description_embedding
+                    )
+                )
+
+    async def upsert_worker():
+        done = False
+        while not done:
+            item = await ready.get()
+            if item is _DONE:
+                break
+            rows, done = await _drain_batch(
+                ready, item, embed_batch_size, flush_interval
+            )
+            try:
+                await processor.supabase_client.aupsert_embeddings(
+                    processor.table_name, rows
+                )
+            except Exception as e:
+                print(f"Error upserting {len(rows)} rows: {str(e)}")
+                for row in rows:
+                    report_error(row, e)
+                continue
+            counts["uploaded"] += len(rows)
+            print(f"Uploaded {len(rows)} rows ({counts['uploaded']} total)")
+            if on_uploaded:
+                on_uploaded(rows)
+
+    async def run_stage(
+        workers: List[asyncio.Task], queue: asyncio.Queue, consumers: int
+    ):
+        await asyncio.gather(*workers)
+        # One end-of-stream marker per downstream worker
+        for _ in range(consumers):
+            await queue.put(_DONE)
+
+    llm_tasks = [asyncio.create_task(llm_worker()) for _ in range(llm_concurrency)]
+    embed_tasks = [
+        asyncio.create_task(embed_worker()) for _ in range(embed_concurrency)
+    ]
+    upsert_tasks = [
+        asyncio.create_task(upsert_worker()) for _ in range(upsert_concurrency)
+    ]
+    await run_stage(llm_tasks, analysed, embed_concurrency)
+    await run_stage(embed_tasks, ready, upsert_concurrency)
+    await asyncio.gather(*upsert_tasks)
+    return counts["uploaded"], counts["errors"]
@@ -1,41 +1,56 @@
+import asyncio
 import base64
+import json
 import os
 import re
-import time
+from typing import Optional
 
 import cv2
 import numpy as np
-from playwright.sync_api import sync_playwright
+from playwright.async_api import async_playwright
+from scraper.browser_pool import BrowserPool, browserbase_url, default_pool
+from scraper.utils.rate_limit import (
+    acall_with_backoff,
+    call_with_backoff,
+    is_retryable,
+)
+from scraper.utils.socrata import dataset_id_from_url
+from scraper.utils.socrata import default_client as socrata_client
 from tqdm import tqdm
 
 url = "https://data.sfgov.org/Public-Safety/Fire-Incidents/wr8u-xric/about_data"  # Replace with the actual website URL
 
+LINKS_SCRIPT = """
+() => {
+    return Array.from(document.querySelectorAll('a')).map(a => a.href);
+}
+"""
+PAGE_TEXT_SCRIPT = "() => document.body.innerText"
+TITLE_SUFFIX_PATTERN = re.compile(r"\s+[|\u2013\u2014-]\s+")
 
-def get_data_links(url):
-    with sync_playwright() as p:
-        browser = p.chromium.connect_over_cdp(
-            f"wss://connect.browserbase.com?apiKey={os.environ['BROWSERBASE_API_KEY']}"
-        )
-        context = browser.contexts[0]
-        page = context.pages[0]
 
+def get_data_links(url, pool: Optional[BrowserPool] = None, use_api: bool = True):
+    # The Socrata views API lists the same downloads without a page render
+    if use_api and dataset_id_from_url(url):
+        try:
+            links = socrata_client().get_dataset(url)["download_links"]
+            if links:
+                return links
+            print(f"No downloads listed by the views API for {url}, using browser")
+        except Exception as e:
+            print(f"Falling back to browser for links of {url}: {e}")
+
+    with (pool or default_pool()).page() as page:
         page.goto(url)
 
         # Find all links on the page
-        links = page.evaluate(
-            """
-            () => {
-                return Array.from(document.querySelectorAll('a')).map(a => a.href);
-            }
-        """
-        )
+        links = page.evaluate(LINKS_SCRIPT)
 
         # Filter links ending with .xlsx or .csv
         download_links = [
             link for link in links if re.search(r"\.(xlsx|csv)$", link, re.IGNORECASE)
         ]
 
-        browser.close()
         return download_links
 
 
@@ -47,39 +62,45 @@ def get_data_links(url):
 #     print(link)
 
 
-def get_page_text(url, max_retries=3, delay=5):
-    retries = 0
-    while retries < max_retries:
+def get_page_text(
+    url,
+    max_retries=3,
+    delay=5,
+    pool: Optional[BrowserPool] = None,
+    use_api: bool = True,
+):
+    if use_api and dataset_id_from_url(url):
         try:
-            with sync_playwright() as p:
-                browser = p.chromium.connect_over_cdp(
-                    f"wss://connect.browserbase.com?apiKey={os.environ['BROWSERBASE_API_KEY']}"
-                )
-                context = browser.contexts[0]
-                page = context.pages[0]
-
-                page.goto(url)
-
-                # Extract all text from the page
-                text_content = page.evaluate(
-                    """
-                    () => {
-                        return document.body.innerText;
-                    }
-                """
-                )
-
-                browser.close()
-                return text_content
+            return socrata_client().get_dataset(url)["text"]
         except Exception as e:
-            print(f"Error: {e}")
-            if "Too Many Requests" in str(e):
-                retries += 1
-                print(f"Retrying {retries}/{max_retries} after {delay} seconds...")
-                time.sleep(delay)
-            else:
-                raise
-    raise Exception("Max retries exceeded")
+            print(f"Falling back to browser for text of {url}: {e}")
+
+    def fetch():
+        with (pool or default_pool()).page() as page:
+            page.goto(url)
+
+            # Extract all text from the page
+            return page.evaluate(PAGE_TEXT_SCRIPT)
+
+    return call_with_backoff(
+        "browserbase", fetch, max_retries=max_retries, base_delay=delay
+    )
+
+
+def get_page_title(url, pool: Optional[BrowserPool] = None, use_api: bool = True):
+    """Dataset name from the views API, else the rendered page's ``<title>``."""
+    if use_api and dataset_id_from_url(url):
+        try:
+            title = socrata_client().get_dataset(url)["title"]
+            if title:
+                return title
+        except Exception as e:
+            print(f"Falling back to browser for title of {url}: {e}")
+
+    with (pool or default_pool()).page() as page:
+        page.goto(url, wait_until="domcontentloaded")
+        # "Fire Incidents | DataSF | City and County of ..." -> "Fire Incidents"
+        return TITLE_SUFFIX_PATTERN.split(page.title())[0].strip()
 
 
 # Example usage
@@ -89,19 +110,12 @@ def get_page_text(url, max_retries=3, delay=5):
 # print(page_text)
 
 
-def take_full_page_screenshot(url):
-    with sync_playwright() as p:
-        browser = p.chromium.connect_over_cdp(
-            f"wss://connect.browserbase.com?apiKey={os.environ['BROWSERBASE_API_KEY']}"
-        )
-        context = browser.contexts[0]
-        page = context.pages[0]
-
+def take_full_page_screenshot(url, pool: Optional[BrowserPool] = None):
+    with (pool or default_pool()).page() as page:
         page.goto(url, wait_until="domcontentloaded")
 
         temp_path = "temp_screenshot.jpeg"
         page.screenshot(path=temp_path, full_page=True)
-        browser.close()
 
         with open(temp_path, "rb") as image_file:
             base64_screenshot = base64.b64encode(image_file.read()).decode("utf-8")
@@ -124,58 +138,157 @@ def display_base64_image(base64_string):
 # display_base64_image(base64_screenshot)
 
 
-def get_text_from_urls(website_urls, max_retries=3, delay=5):
-    with sync_playwright() as p:
-        browser = p.chromium.connect_over_cdp(
-            f"wss://connect.browserbase.com?apiKey={os.environ['BROWSERBASE_API_KEY']}"
+def _write_checkpoint(website_urls, rendered: int) -> None:
+    with open(f"scraper/checkpoints/checkpoint_{rendered + 124}.json", "w") as f:
+        json.dump(website_urls, f)
+
+
+def get_text_from_urls(
+    website_urls,
+    max_retries=3,
+    delay=5,
+    pool: Optional[BrowserPool] = None,
+    concurrency: int = 1,
+    use_api: bool = True,
+):
+    # Resolve what we can from the views API first; only the rest is rendered
+    to_render = website_urls
+    if use_api:
+        datasets = socrata_client().get_datasets(
+            [website["url"] for website in website_urls]
+        )
+        for website, dataset in zip(website_urls, datasets):
+            if dataset is not None:
+                website["text"] = dataset["text"]
+        to_render = [w for w, d in zip(website_urls, datasets) if d is None]
+        print(
+            f"Views API: {len(website_urls) - len(to_render)} pages, "
+            f"{len(to_render)} left for the browser"
         )
-        context = browser.contexts[0]
-        page = context.pages[0]
+        # Keep the API results even if nothing is left to render or the
+        # browser crawl dies before its first checkpoint
+        _write_checkpoint(website_urls, 0)
+
+    if concurrency > 1:
+        asyncio.run(
+            get_text_from_urls_concurrent(
+                to_render,
+                concurrency,
+                max_retries=max_retries,
+                delay=delay,
+                checkpoint_urls=website_urls,
+            )
+        )
+        return website_urls
+
+    pool = pool or default_pool()
+    for index, website in enumerate(tqdm(to_render, desc="Processing URLs")):
+        try:
+            website["text"] = get_page_text(
+                website["url"],
+                max_retries=max_retries,
+                delay=delay,
+                pool=pool,
+                use_api=False,
+            )
+        except Exception as e:
+            # Out of retries on a rate limit or dropped connection: skip the
+            # page and leave it without text, anything else stops the crawl
+            if not is_retryable(e):
+                raise
+            print(f"Skipping {website['url']}: {e}")
+
+        # Save checkpoint every 50 iterations
+        if (index + 1) % 25 == 0:
+            _write_checkpoint(website_urls, index + 1)
 
-        for index, website in enumerate(tqdm(website_urls, desc="Processing URLs")):
-            url = website["url"]
-            retries = 0
-            while retries < max_retries:
+    return website_urls
+
+
+async def _get_text_with_retries(page, url, max_retries, delay):
+    async def fetch():
+        await page.goto(url)
+        return await page.evaluate(PAGE_TEXT_SCRIPT)
+
+    return await acall_with_backoff(
+        "browserbase", fetch, max_retries=max_retries, base_delay=delay
+    )
+
+
+async def get_text_from_urls_concurrent(
+    website_urls,
+    concurrency: int = 4,
+    sessions: int = 1,
+    max_retries=3,
+    delay=5,
+    checkpoint_every: int = 25,
+    checkpoint_urls=None,
+):
+    """Crawl ``website_urls`` with ``concurrency`` pages pulling from one
+    shared queue. Pages are spread over ``sessions`` remote browsers; text is
+    written into each website dict in place, so input order is preserved.
+    Checkpoints save ``checkpoint_urls`` (the full list the pages came from)
+    when given, else ``website_urls``."""
+    queue: asyncio.Queue = asyncio.Queue()
+    for website in website_urls:
+        queue.put_nowait(website)
+    progress = tqdm(total=len(website_urls), desc="Processing URLs")
+    completed = 0
+
+    async def worker(context):
+        nonlocal completed
+        page = await context.new_page()
+        try:
+            while not queue.empty():
+                website = queue.get_nowait()
+                if page.is_closed():
+                    page = await context.new_page()
                 try:
-                    page.goto(url)
-                    text_content = page.evaluate(
-                        """
-                        () => {
-                            return document.body.innerText;
-                        }
-                        """
+                    website["text"] = await _get_text_with_retries(
+                        page, website["url"], max_retries, delay
                     )
-                    website["text"] = text_content
-                    break
                 except Exception as e:
-                    print(f"Error: {e}")
-                    if "Too Many Requests" in str(e):
-                        retries += 1
-                        print(
-                            f"Retrying {retries}/{max_retries} after {delay} seconds..."
-                        )
-                    else:
+                    if not is_retryable(e):
                         raise
+                    print(f"Skipping {website['url']}: {e}")
+                completed += 1
+                progress.update(1)
+                if completed % checkpoint_every == 0:
+                    _write_checkpoint(checkpoint_urls or website_urls, completed)
+        finally:
+            await page.close()
+
+    async with async_playwright() as p:
+        browsers = [
+            await p.chromium.connect_over_cdp(browserbase_url())
+            for _ in range(sessions)
+        ]
+        try:
+            contexts = [
+                browser.contexts[0] if browser.contexts else await browser.new_context()
+                for browser in browsers
+            ]
+            # A page that runs out of retries is skipped without text; any
+            # other failure cancels the remaining workers, matching the
+            # sequential crawl.
+            async with asyncio.TaskGroup() as group:
+                for i in range(concurrency):
+                    group.create_task(worker(contexts[i % len(contexts)]))
+        finally:
+            progress.close()
+            for browser in browsers:
+                await browser.close()
 
-            # Save checkpoint every 50 iterations
-            if (index + 1) % 25 == 0:
-                with open(
-                    f"scraper/checkpoints/checkpoint_{index + 1 + 124}.json", "w"
-                ) as f:
-                    json.dump(website_urls, f)
-
-        browser.close()
     return website_urls
 
 
 import glob
-import json
 
 if __name__ == "__main__":
     with open("scraper/download_links.json", "r") as f:
         data_links = json.load(f)
     data_links = data_links[125:]
-    enhanced_data_links = get_text_from_urls(data_links)
+    enhanced_data_links = get_text_from_urls(data_links, concurrency=8)
     with open("scraper/enhanced_data_links.json", "w") as f:
         json.dump(enhanced_data_links, f)
 
@@ -0,0 +1,78 @@
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, Optional
+
+import requests
+from scraper.utils.utils import DownloadResult, stream_download
+
+
+class DownloadCache:
+    """Local copy of downloaded files revalidated with conditional GETs.
+
+    ``index.json`` records each URL's file, ETag, Last-Modified and hash.
+    Later fetches send ``If-None-Match``/``If-Modified-Since``, and a 304
+    reuses the cached file without transferring the body again.
+    """
+
+    def __init__(self, cache_dir: str = "scraper/cache/downloads"):
+        self.cache_dir = cache_dir
+        self.index_path = os.path.join(cache_dir, "index.json")
+        self.lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+        self.index: Dict[str, Dict[str, Any]] = {}
+        if os.path.exists(self.index_path):
+            with open(self.index_path, "r") as f:
+                self.index = json.load(f)
+
+    def _save_index(self) -> None:
+        tmp_path = f"{self.index_path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.index, f, indent=2)
+        os.replace(tmp_path, self.index_path)
+
+    def conditional_headers(self, url: str) -> Dict[str, str]:
+        entry = self.index.get(url)
+        if not entry or not os.path.exists(entry["path"]):
+            return {}
+        headers = {}
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def fetch(
+        self,
+        url: str,
+        filename: str,
+        session: Optional[requests.Session] = None,
+        **kwargs,
+    ) -> DownloadResult:
+        """Return a local copy of ``url``, downloading only if it changed."""
+        entry = self.index.get(url)
+        path = entry["path"] if entry else os.path.join(self.cache_dir, filename)
+        result = stream_download(
+            url,
+            path,
+            session=session,
+            headers=self.conditional_headers(url),
+            **kwargs,
+        )
+        if result.not_modified:
+            print(f"Not modified, using cached {path}")
+            result.sha256 = entry["sha256"]
+            return result
+
+        with self.lock:
+            self.index[url] = {
+                "path": result.path,
+                "etag": result.etag,
+                "last_modified": result.last_modified,
+                "sha256": result.sha256,
+                "size": result.total_bytes,
+                "fetched_at": time.time(),
+            }
+            self._save_index()
+        return result
@@ -0,0 +1,125 @@
+import hashlib
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, List, Optional, Union
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from scraper.utils.download_cache import DownloadCache
+from scraper.utils.socrata import dataset_id_from_url
+from scraper.utils.utils import DownloadResult, file_extension, stream_download
+from tqdm import tqdm
+
+
+def read_url_file(path: str) -> List[str]:
+    with open(path, "r") as f:
+        return [line.strip() for line in f if line.strip() and not line.startswith("#")]
+
+
+def local_filename(url: str) -> str:
+    """``rows.csv`` exports are named after their dataset id, anything else
+    after a hash of the URL."""
+    dataset_id = dataset_id_from_url(url)
+    if dataset_id and url.split("?")[0].endswith("/rows.csv"):
+        return f"{dataset_id}.csv"
+    name = hashlib.sha256(url.encode("utf-8")).hexdigest()[:16]
+    return f"{name}.{file_extension(url)}"
+
+
+class DownloadManager:
+    """Downloads many files in parallel over one keep-alive connection pool.
+
+    ``max_workers`` bounds total concurrency and ``per_host`` bounds how many
+    transfers hit the same host at once, so a long URL list saturates
+    bandwidth without hammering a single portal.
+    """
+
+    def __init__(
+        self,
+        save_dir: str,
+        max_workers: int = 16,
+        per_host: int = 4,
+        cache: Optional[DownloadCache] = None,
+    ):
+        self.save_dir = save_dir
+        self.cache = cache
+        self.max_workers = max_workers
+        self.per_host = per_host
+        os.makedirs(save_dir, exist_ok=True)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=8, pool_maxsize=max_workers)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self._host_limits: Dict[str, threading.Semaphore] = {}
+        self._lock = threading.Lock()
+
+    def _host_limit(self, url: str) -> threading.Semaphore:
+        host = urlparse(url).netloc
+        with self._lock:
+            if host not in self._host_limits:
+                self._host_limits[host] = threading.Semaphore(self.per_host)
+            return self._host_limits[host]
+
+    def download(self, url: str, save_path: Optional[str] = None) -> DownloadResult:
+        with self._host_limit(url):
+            if self.cache is not None and save_path is None:
+                return self.cache.fetch(
+                    url,
+                    local_filename(url),
+                    session=self.session,
+                    report_every=float("inf"),
+                )
+            save_path = save_path or os.path.join(self.save_dir, local_filename(url))
+            return stream_download(
+                url, save_path, session=self.session, report_every=float("inf")
+            )
+
+    def download_all(
+        self, urls: Union[List[str], str]
+    ) -> Dict[str, Union[DownloadResult, Exception]]:
+        """Download every URL (or every line of a URL file).
+
+        Returns a mapping of URL to its result, or to the exception it failed
+        with, so one bad link doesn't stop the batch.
+        """
+        if isinstance(urls, str):
+            urls = read_url_file(urls)
+        results = {}
+        total_bytes = 0
+        unchanged = 0
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {executor.submit(self.download, url): url for url in urls}
+            with tqdm(total=len(futures), desc="Downloading") as progress:
+                for future in as_completed(futures):
+                    url = futures[future]
+                    try:
+                        results[url] = future.result()
+                        total_bytes += results[url].bytes_written
+                        unchanged += results[url].not_modified
+                    except Exception as e:
+                        print(f"Failed to download {url}: {e}")
+                        results[url] = e
+                    progress.set_postfix(
+                        MB=f"{total_bytes / (1024 * 1024):.0f}",
+                        unchanged=unchanged,
+                        failed=sum(isinstance(r, Exception) for r in results.values()),
+                    )
+                    progress.update(1)
+        return results
+
+
+if __name__ == "__main__":
+    import sys
+
+    # download_manager.py <url_file> <save_dir> [max_workers]
+    # Files are kept in <save_dir> and revalidated on later runs.
+    manager = DownloadManager(
+        sys.argv[2],
+        max_workers=int(sys.argv[3]) if len(sys.argv) > 3 else 16,
+        cache=DownloadCache(sys.argv[2]),
+    )
+    results = manager.download_all(sys.argv[1])
+    failed = [url for url, r in results.items() if isinstance(r, Exception)]
+    print(f"Downloaded {len(results) - len(failed)} files, {len(failed)} failed")
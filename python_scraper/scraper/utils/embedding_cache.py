@@ -0,0 +1,124 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+DEFAULT_CACHE_PATH = "scraper/cache/embeddings.sqlite3"
+# ~200MB of voyage-3 vectors (1024 float32 values each)
+DEFAULT_MAX_ENTRIES = 50_000
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS embeddings (
+    model TEXT NOT NULL,
+    input_type TEXT NOT NULL,
+    text_hash TEXT NOT NULL,
+    vector BLOB NOT NULL,
+    last_used REAL NOT NULL,
+    PRIMARY KEY (model, input_type, text_hash)
+)
+"""
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """Content-addressed on-disk cache of embeddings, keyed by
+    (model, input_type, sha256(text)) and evicted least-recently-used first."""
+
+    def __init__(
+        self, path: str = DEFAULT_CACHE_PATH, max_entries: int = DEFAULT_MAX_ENTRIES
+    ):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(SCHEMA)
+        self.conn.execute(
+            "CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)"
+        )
+        self.conn.commit()
+
+    def get_many(
+        self, texts: list[str], model: str, input_type: str
+    ) -> dict[int, list[float]]:
+        """Return cached embeddings for ``texts`` as a mapping of index to vector."""
+        hashes = [text_hash(text) for text in texts]
+        found = {}
+        with self.lock:
+            for start in range(0, len(hashes), 500):
+                chunk = list(set(hashes[start : start + 500]))
+                placeholders = ",".join("?" * len(chunk))
+                rows = self.conn.execute(
+                    "SELECT text_hash, vector FROM embeddings "
+                    "WHERE model = ? AND input_type = ? "
+                    f"AND text_hash IN ({placeholders})",
+                    [model, input_type, *chunk],
+                ).fetchall()
+                found.update(rows)
+            if found:
+                now = time.time()
+                self.conn.executemany(
+                    "UPDATE embeddings SET last_used = ? "
+                    "WHERE model = ? AND input_type = ? AND text_hash = ?",
+                    [(now, model, input_type, h) for h in found],
+                )
+                self.conn.commit()
+
+        return {
+            i: np.frombuffer(found[h], dtype=np.float32).tolist()
+            for i, h in enumerate(hashes)
+            if h in found
+        }
+
+    def put_many(
+        self,
+        texts: list[str],
+        embeddings: list[list[float]],
+        model: str,
+        input_type: str,
+    ) -> None:
+        now = time.time()
+        rows = [
+            (
+                model,
+                input_type,
+                text_hash(text),
+                np.asarray(embedding, dtype=np.float32).tobytes(),
+                now,
+            )
+            for text, embedding in zip(texts, embeddings)
+        ]
+        with self.lock:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO embeddings "
+                "(model, input_type, text_hash, vector, last_used) "
+                "VALUES (?, ?, ?, ?, ?)",
+                rows,
+            )
+            self._evict()
+            self.conn.commit()
+
+    def _evict(self) -> None:
+        (count,) = self.conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+        excess = count - self.max_entries
+        if excess > 0:
+            self.conn.execute(
+                "DELETE FROM embeddings WHERE rowid IN "
+                "(SELECT rowid FROM embeddings ORDER BY last_used ASC LIMIT ?)",
+                (excess,),
+            )
+
+    def __len__(self) -> int:
+        with self.lock:
+            (count,) = self.conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+        return count
+
+    def close(self) -> None:
+        self.conn.close()
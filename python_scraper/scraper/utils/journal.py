@@ -0,0 +1,87 @@
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+
+class IngestJournal:
+    """Append-only JSONL record of ingest progress.
+
+    Every committed row and every failure is appended (and fsynced) as soon
+    as it happens, so a crashed run can be restarted and skip the dataset ids
+    that already reached Supabase. Committed rows themselves are streamed to
+    ``results_path`` instead of being held in memory.
+    """
+
+    def __init__(self, path: str, results_path: Optional[str] = None):
+        self.path = path
+        self.results_path = results_path
+        self.lock = threading.Lock()
+        self.committed_ids = set()
+        self.failures: Dict[str, Dict[str, Any]] = {}
+        self._load()
+        self._file = open(path, "a")
+        if self._file.tell() > 0:
+            with open(path, "rb") as f:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    # Terminate a torn line so new records start cleanly
+                    self._file.write("\n")
+        self._results_file = open(results_path, "a") if results_path else None
+
+    def _load(self) -> None:
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "r") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # A crash mid-write leaves at most one torn trailing line
+                    continue
+                if record["status"] == "committed":
+                    self.committed_ids.add(record["id"])
+                    self.failures.pop(record["id"], None)
+                else:
+                    self.failures[record["id"]] = record
+
+    def _append(self, file, records: List[Dict[str, Any]]) -> None:
+        file.write("".join(json.dumps(record) + "\n" for record in records))
+        file.flush()
+        os.fsync(file.fileno())
+
+    def committed(self, rows: List[Dict[str, Any]]) -> None:
+        now = time.time()
+        with self.lock:
+            if self._results_file:
+                self._append(self._results_file, rows)
+            self._append(
+                self._file,
+                [{"id": row["id"], "status": "committed", "ts": now} for row in rows],
+            )
+            for row in rows:
+                self.committed_ids.add(row["id"])
+                self.failures.pop(row["id"], None)
+
+    def failed(self, id: str, url: str, error: str) -> None:
+        record = {"id": id, "status": "failed", "url": url, "error": error}
+        record["ts"] = time.time()
+        with self.lock:
+            self._append(self._file, [record])
+            self.failures[id] = record
+
+    def pending(self, entries: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Entries whose dataset id has not been committed yet."""
+        return [entry for entry in entries if entry["id"] not in self.committed_ids]
+
+    def close(self) -> None:
+        self._file.close()
+        if self._results_file:
+            self._results_file.close()
+
+    def __enter__(self) -> "IngestJournal":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
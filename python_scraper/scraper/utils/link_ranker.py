@@ -0,0 +1,64 @@
+import re
+from difflib import SequenceMatcher
+from typing import Optional
+from urllib.parse import parse_qs, unquote, urlparse
+
+ROWS_CSV_PATTERN = re.compile(r"/api/views/[a-z0-9]{4}-[a-z0-9]{4}/rows\.csv")
+EXTENSION_SCORES = {"csv": 2.0, "xlsx": 1.5, "xls": 1.0, "json": 0.5, "geojson": 0.5}
+# Attachments that describe a dataset rather than contain it
+AUXILIARY_PATTERN = re.compile(
+    r"data[\s_-]*dictionary|metadata|readme|codebook|schema|glossary", re.IGNORECASE
+)
+WORD_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+def link_filename(link: str) -> str:
+    parsed = urlparse(link)
+    filename = parse_qs(parsed.query).get("filename")
+    if filename:
+        return unquote(filename[0])
+    return unquote(parsed.path.rstrip("/").rsplit("/", 1)[-1])
+
+
+def _words(text: str) -> str:
+    return " ".join(WORD_PATTERN.findall(text.lower()))
+
+
+def score_link(link: str, title: str = "") -> float:
+    """Rule-based likelihood that ``link`` is the dataset's main download."""
+    filename = link_filename(link)
+    stem, _, extension = filename.rpartition(".")
+    score = EXTENSION_SCORES.get(extension.lower(), 0.0)
+    if ROWS_CSV_PATTERN.search(link):
+        score += 3.0
+    if AUXILIARY_PATTERN.search(filename):
+        score -= 3.0
+    if title and stem:
+        score += 2.0 * SequenceMatcher(None, _words(stem), _words(title)).ratio()
+    return score
+
+
+def rank_links(links: list[str], title: str = "") -> list[tuple[str, float]]:
+    """Links with their scores, best first."""
+    return sorted(
+        ((link, score_link(link, title)) for link in dict.fromkeys(links)),
+        key=lambda item: item[1],
+        reverse=True,
+    )
+
+
+def choose_link(
+    links: list[str], title: str = "", margin: float = 1.5, top_n: int = 3
+) -> tuple[Optional[str], list[str]]:
+    """Pick a link without the LLM when one clearly wins.
+
+    Returns the winner (or ``None`` if the top scores are within ``margin``
+    of each other) and the ``top_n`` best candidates to ask the LLM about
+    otherwise.
+    """
+    ranked = rank_links(links, title)
+    if not ranked:
+        return None, []
+    if len(ranked) == 1 or ranked[0][1] - ranked[1][1] >= margin:
+        return ranked[0][0], [ranked[0][0]]
+    return None, [link for link, _ in ranked[:top_n]]
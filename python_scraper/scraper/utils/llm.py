@@ -1,9 +1,24 @@
+import math
 import os
+import re
+import threading
+import time
+from dataclasses import dataclass, field
 from enum import Enum
-from typing import Type
+from typing import Optional, Type
 
-from openai import OpenAI
+from openai import AsyncOpenAI, OpenAI
+from openai.lib._parsing._completions import type_to_response_format_param
 from pydantic import BaseModel, Field, create_model
+from scraper.utils.link_ranker import choose_link
+from scraper.utils.llm_batch import DEFAULT_BATCH_DIR, BatchRunner
+from scraper.utils.llm_cache import (
+    DEFAULT_LLM_CACHE_PATH,
+    LLMResponseCache,
+    response_key,
+)
+from scraper.utils.prompt import DEFAULT_PROMPT_TOKENS, PromptCompactor, count_tokens
+from scraper.utils.rate_limit import acall_with_backoff, call_with_backoff
 from scraper.utils.utils import get_content_objects
 
 
@@ -33,88 +48,610 @@ class WithoutDownloadLinkResponse(BaseModel):
     description: str
 
 
+class PackedPageResponse(WithoutDownloadLinkResponse):
+    id: str
+
+
+class PackedResponse(BaseModel):
+    pages: list[PackedPageResponse]
+
+
+# Cheapest first; a response is escalated to the next tier when it fails
+# validation or the model was unsure of it
+MODEL_TIERS = ["gpt-4o-mini", "gpt-4o-2024-08-06"]
+
+
+@dataclass
+class TierStats:
+    calls: int = 0
+    accepted: int = 0
+    escalated: int = 0
+    latencies: list[float] = field(default_factory=list)
+
+    def summary(self) -> dict:
+        latencies = sorted(self.latencies)
+        return {
+            "calls": self.calls,
+            "accepted": self.accepted,
+            "escalated": self.escalated,
+            "hit_rate": self.accepted / self.calls if self.calls else 0.0,
+            "p50_s": latencies[len(latencies) // 2] if latencies else 0.0,
+            "p95_s": latencies[int(len(latencies) * 0.95)] if latencies else 0.0,
+        }
+
+
+def _has_empty_field(value) -> bool:
+    if isinstance(value, str):
+        return not value.strip()
+    if isinstance(value, list):
+        return not value or any(_has_empty_field(item) for item in value)
+    if isinstance(value, dict):
+        return any(_has_empty_field(item) for item in value.values())
+    return False
+
+
+def _confidence(choice, field_name: str) -> float:
+    """Lowest token probability within the string values of ``field_name``.
+
+    JSON scaffolding and long free text are near-certain and would hide an
+    unsure title in an average, so only the key field's value counts. Every
+    occurrence is checked, e.g. each page's title in a packed response.
+    """
+    if choice.logprobs is None or not choice.logprobs.content:
+        return 1.0
+    tokens = choice.logprobs.content
+    output = "".join(token.token for token in tokens)
+    pattern = re.compile(rf'"{re.escape(field_name)}"\s*:\s*"((?:[^"\\]|\\.)*)"')
+    spans = [match.span(1) for match in pattern.finditer(output)]
+    lowest = 0.0
+    position = 0
+    for token in tokens:
+        end = position + len(token.token)
+        if any(
+            position < span_end and end > span_start for span_start, span_end in spans
+        ):
+            lowest = min(lowest, token.logprob)
+        position = end
+    return math.exp(lowest)
+
+
 class LLMClient:
-    def __init__(self):
-        self.openai_client = OpenAI(api_key=os.environ["OPENAI_API_KEY"])
+    def __init__(
+        self,
+        max_prompt_tokens: int = DEFAULT_PROMPT_TOKENS,
+        use_cache: bool = True,
+        models: Optional[list[str]] = None,
+        min_confidence: float = 0.5,
+    ):
+        # Scraped page text is stripped of cross-page boilerplate and capped
+        self.compactor = PromptCompactor(max_prompt_tokens)
+        self.cache = (
+            LLMResponseCache(os.getenv("LLM_CACHE_PATH", DEFAULT_LLM_CACHE_PATH))
+            if use_cache
+            else None
+        )
+        tiers = os.getenv("LLM_MODEL_TIERS")
+        self.models = models or (tiers.split(",") if tiers else MODEL_TIERS)
+        self.min_confidence = min_confidence
+        self.tier_stats = {model: TierStats() for model in self.models}
+        self.stats_lock = threading.Lock()
+        # Retries are handled by the shared rate limiter, not the SDK
+        self.openai_client = OpenAI(api_key=os.environ["OPENAI_API_KEY"], max_retries=0)
+        self.async_openai_client = AsyncOpenAI(
+            api_key=os.environ["OPENAI_API_KEY"], max_retries=0
+        )
+
+    def _parse(self, **kwargs):
+        return call_with_backoff(
+            "openai", self.openai_client.beta.chat.completions.parse, **kwargs
+        )
+
+    async def _aparse(self, **kwargs):
+        return await acall_with_backoff(
+            "openai", self.async_openai_client.beta.chat.completions.parse, **kwargs
+        )
+
+    def _cached(self, messages: list[dict], response_format: Type[BaseModel]):
+        # An answer accepted from any tier is good enough to reuse
+        if self.cache is None:
+            return None
+        return self.cache.get_any(
+            [response_key(model, messages, response_format) for model in self.models],
+            response_format,
+        )
+
+    def _store(
+        self,
+        model: str,
+        messages: list[dict],
+        response_format: Type[BaseModel],
+        parsed: BaseModel,
+    ) -> None:
+        if self.cache is not None and parsed is not None:
+            self.cache.put(
+                response_key(model, messages, response_format), model, parsed
+            )
+
+    def _tier_kwargs(self, tier: int) -> dict:
+        # Logprobs are only needed to decide whether to escalate
+        return {"logprobs": True} if tier < len(self.models) - 1 else {}
+
+    def _judge(
+        self,
+        tier: int,
+        completion,
+        elapsed: float,
+        confidence_field: str,
+        min_confidence: Optional[float],
+    ) -> Optional[str]:
+        """Record a tier's response; return why it should escalate, if so."""
+        model = self.models[tier]
+        choice = completion.choices[0]
+        refused = choice.message.parsed is None
+        reason = None
+        if min_confidence is None:
+            min_confidence = self.min_confidence
+        if tier < len(self.models) - 1:
+            confidence = _confidence(choice, confidence_field)
+            if refused:
+                reason = "refused"
+            elif _has_empty_field(choice.message.parsed.model_dump()):
+                reason = "left fields empty"
+            elif confidence < min_confidence:
+                reason = f"low confidence in {confidence_field} ({confidence:.2f})"
+        with self.stats_lock:
+            stats = self.tier_stats[model]
+            stats.calls += 1
+            stats.latencies.append(elapsed)
+            if reason:
+                stats.escalated += 1
+            elif not refused:
+                stats.accepted += 1
+        if reason:
+            print(f"{model} {reason}, escalating")
+        return reason
+
+    def _record_failure(self, tier: int, error: Exception, elapsed: float) -> None:
+        model = self.models[tier]
+        with self.stats_lock:
+            stats = self.tier_stats[model]
+            stats.calls += 1
+            stats.escalated += 1
+            stats.latencies.append(elapsed)
+        print(f"{model} failed ({str(error)}), escalating")
+
+    def _cascade(
+        self,
+        messages: list[dict],
+        response_format: Type[BaseModel],
+        key_messages: Optional[list[dict]] = None,
+        confidence_field: str = "title",
+        min_confidence: Optional[float] = None,
+    ) -> tuple[BaseModel, Optional[str]]:
+        """Parsed response and the model that produced it (``None`` if cached).
+
+        The cache is keyed on ``key_messages`` when given: the same prompt
+        built from the raw page text, which unlike the compacted text doesn't
+        depend on which other pages the compactor has seen. A cheaper tier's
+        answer is escalated when its least likely token in
+        ``confidence_field`` is below ``min_confidence`` (the client's
+        default when ``None``).
+        """
+        key_messages = key_messages or messages
+        cached = self._cached(key_messages, response_format)
+        if cached is not None:
+            return cached, None
+        for tier, model in enumerate(self.models):
+            start = time.monotonic()
+            try:
+                completion = self._parse(
+                    model=model,
+                    messages=messages,
+                    response_format=response_format,
+                    **self._tier_kwargs(tier),
+                )
+            except Exception as e:
+                if tier == len(self.models) - 1:
+                    raise
+                self._record_failure(tier, e, time.monotonic() - start)
+                continue
+            reason = self._judge(
+                tier,
+                completion,
+                time.monotonic() - start,
+                confidence_field,
+                min_confidence,
+            )
+            if reason is None:
+                return self._accept(model, completion, key_messages, response_format)
+
+    async def _acascade(
+        self,
+        messages: list[dict],
+        response_format: Type[BaseModel],
+        key_messages: Optional[list[dict]] = None,
+        confidence_field: str = "title",
+        min_confidence: Optional[float] = None,
+    ) -> tuple[BaseModel, Optional[str]]:
+        key_messages = key_messages or messages
+        cached = self._cached(key_messages, response_format)
+        if cached is not None:
+            return cached, None
+        for tier, model in enumerate(self.models):
+            start = time.monotonic()
+            try:
+                completion = await self._aparse(
+                    model=model,
+                    messages=messages,
+                    response_format=response_format,
+                    **self._tier_kwargs(tier),
+                )
+            except Exception as e:
+                if tier == len(self.models) - 1:
+                    raise
+                self._record_failure(tier, e, time.monotonic() - start)
+                continue
+            reason = self._judge(
+                tier,
+                completion,
+                time.monotonic() - start,
+                confidence_field,
+                min_confidence,
+            )
+            if reason is None:
+                return self._accept(model, completion, key_messages, response_format)
+
+    def _accept(
+        self,
+        model: str,
+        completion,
+        key_messages: list[dict],
+        response_format: Type[BaseModel],
+    ) -> tuple[BaseModel, str]:
+        message = completion.choices[0].message
+        # Only the last tier gets here without a parsed response
+        if message.parsed is None:
+            raise ValueError(
+                f"{model} refused to answer: {message.refusal or 'no reason given'}"
+            )
+        self._store(model, key_messages, response_format, message.parsed)
+        return message.parsed, model
+
+    def _structured(
+        self,
+        messages: list[dict],
+        response_format: Type[BaseModel],
+        key_messages: Optional[list[dict]] = None,
+        confidence_field: str = "title",
+        min_confidence: Optional[float] = None,
+    ):
+        """Parsed response for ``messages`` from the cache or the cascade."""
+        parsed, _ = self._cascade(
+            messages, response_format, key_messages, confidence_field, min_confidence
+        )
+        return parsed
+
+    async def _astructured(
+        self,
+        messages: list[dict],
+        response_format: Type[BaseModel],
+        key_messages: Optional[list[dict]] = None,
+        confidence_field: str = "title",
+        min_confidence: Optional[float] = None,
+    ):
+        parsed, _ = await self._acascade(
+            messages, response_format, key_messages, confidence_field, min_confidence
+        )
+        return parsed
+
+    def cascade_stats(self) -> dict:
+        with self.stats_lock:
+            return {model: stats.summary() for model, stats in self.tier_stats.items()}
 
     def get_response(self, image, text, data_links):
         content = get_content_objects(image, "jpeg")
-        messages = [
-            {
-                "role": "system",
-                "content": "Analyze the following content and identify the most relevant download link. The content includes a screenshot of the page, scraped text, and available download links.",
-            },
-            {
-                "role": "user",
-                "content": [
-                    {"type": "text", "text": "Screenshot of the page:"},
-                    *content,
-                    {"type": "text", "text": f"Scraped text from the page:\n{text}"},
-                    {
-                        "type": "text",
-                        "text": f"Available download links:\n{', '.join(data_links)}",
-                    },
-                ],
-            },
-        ]
 
-        completion = self.openai_client.beta.chat.completions.parse(
-            model="gpt-4o-2024-08-06",
-            messages=messages,
-            response_format=DataResponse.with_dynamic_enum(data_links),
-        )
+        def messages(page_text):
+            return [
+                {
+                    "role": "system",
+                    "content": "Analyze the following content and identify the most relevant download link. The content includes a screenshot of the page, scraped text, and available download links.",
+                },
+                {
+                    "role": "user",
+                    "content": [
+                        {"type": "text", "text": "Screenshot of the page:"},
+                        *content,
+                        {
+                            "type": "text",
+                            "text": f"Scraped text from the page:\n{page_text}",
+                        },
+                        {
+                            "type": "text",
+                            "text": f"Available download links:\n{', '.join(data_links)}",
+                        },
+                    ],
+                },
+            ]
 
-        return completion.choices[0].message.parsed
+        return self._structured(
+            messages(self.compactor.compact(text)),
+            DataResponse.with_dynamic_enum(data_links),
+            key_messages=messages(text),
+            confidence_field="primary_data_link",
+        )
 
     def get_text_response_and_download_link(
-        self, text: str, data_links: list[str]
+        self, text: str, data_links: list[str], title: Optional[str] = None
     ) -> DataResponse:
-        messages = [
-            {
-                "role": "system",
-                "content": "Analyze the following content and identify the most relevant download link. The content includes scraped text and available download links.",
-            },
-            {
-                "role": "user",
-                "content": [
-                    {"type": "text", "text": f"Scraped text from the page:\n{text}"},
-                    {
-                        "type": "text",
-                        "text": f"Available download links:\n{', '.join(data_links)}",
-                    },
-                ],
-            },
-        ]
+        # Links are ranked by rules first. A clear winner needs only the
+        # title/description call; otherwise the top few go into the enum.
+        # Without a view name or page <title> the title-overlap feature is
+        # skipped; the first text line is usually site navigation.
+        winner, candidates = choose_link(data_links, title or "")
+        if winner is not None:
+            page_analysis = self.get_text_response(text)
+            return DataResponse(
+                title=page_analysis.title,
+                description=page_analysis.description,
+                primary_data_link=winner,
+            )
 
-        completion = self.openai_client.beta.chat.completions.parse(
-            model="gpt-4o-2024-08-06",
-            messages=messages,
-            response_format=DataResponse.with_dynamic_enum(data_links),
+        def messages(page_text):
+            return [
+                {
+                    "role": "system",
+                    "content": "Analyze the following content and identify the most relevant download link. The content includes scraped text and available download links.",
+                },
+                {
+                    "role": "user",
+                    "content": [
+                        {
+                            "type": "text",
+                            "text": f"Scraped text from the page:\n{page_text}",
+                        },
+                        {
+                            "type": "text",
+                            "text": f"Available download links:\n{', '.join(candidates)}",
+                        },
+                    ],
+                },
+            ]
+
+        page_analysis = self._structured(
+            messages(self.compactor.compact(text)),
+            DataResponse.with_dynamic_enum(candidates),
+            key_messages=messages(text),
+            confidence_field="primary_data_link",
+        )
+        return DataResponse(
+            title=page_analysis.title,
+            description=page_analysis.description,
+            primary_data_link=page_analysis.primary_data_link.value,
         )
 
-        return completion.choices[0].message.parsed
+    def _text_response_messages(
+        self, text: str, schema: Optional[str] = None
+    ) -> tuple[list[dict], list[dict]]:
+        """Prompt messages for ``text`` and the raw-text messages to key
+        its cache entry on."""
+        return (
+            self._text_messages(self.compactor.compact(text), schema),
+            self._text_messages(text, schema),
+        )
 
-    def get_text_response(self, text: str) -> WithoutDownloadLinkResponse:
-        messages = [
+    def _text_messages(
+        self, page_text: str, schema: Optional[str] = None
+    ) -> list[dict]:
+        content = [
+            {"type": "text", "text": f"Scraped text from the page:\n{page_text}"}
+        ]
+        if schema:
+            content.append(
+                {"type": "text", "text": f"Columns sampled from the data:\n{schema}"}
+            )
+        return [
             {
                 "role": "system",
                 "content": "Analyze the following content and extract the title and description.",
             },
+            {"role": "user", "content": content},
+        ]
+
+    def get_text_response(
+        self, text: str, schema: Optional[str] = None
+    ) -> WithoutDownloadLinkResponse:
+        messages, key_messages = self._text_response_messages(text, schema)
+        return self._structured(messages, WithoutDownloadLinkResponse, key_messages)
+
+    async def aget_text_response(
+        self, text: str, schema: Optional[str] = None
+    ) -> WithoutDownloadLinkResponse:
+        messages, key_messages = self._text_response_messages(text, schema)
+        return await self._astructured(
+            messages, WithoutDownloadLinkResponse, key_messages
+        )
+
+    def _packed_messages(self, pages: list[tuple]) -> list[dict]:
+        content = []
+        for dataset_id, page_text, schema in pages:
+            text = f"Page {dataset_id}:\n{page_text}"
+            if schema:
+                text += f"\nColumns sampled from the data:\n{schema}"
+            content.append({"type": "text", "text": text})
+        return [
             {
-                "role": "user",
-                "content": [
-                    {"type": "text", "text": f"Scraped text from the page:\n{text}"},
-                ],
+                "role": "system",
+                "content": "Each of the following pages is labelled with an id. For every page, extract the title and description and return them with that page's id.",
             },
+            {"role": "user", "content": content},
         ]
 
-        completion = self.openai_client.beta.chat.completions.parse(
-            model="gpt-4o-2024-08-06",
-            messages=messages,
-            response_format=WithoutDownloadLinkResponse,
+    def get_text_responses_packed(
+        self,
+        entries: list[dict],
+        max_prompt_tokens: int = 16_000,
+        max_pages: int = 16,
+    ) -> tuple[dict[str, WithoutDownloadLinkResponse], dict[str, str]]:
+        """``get_text_response`` for many short pages, several per request.
+
+        Pages are packed greedily until ``max_prompt_tokens`` or
+        ``max_pages`` is reached; pages using more than half the budget go
+        alone. Any page a packed response leaves out or gets wrong, or every
+        page of a pack that fails to parse, is retried as a single-page call.
+        Returns parsed responses and error messages keyed by dataset id.
+        """
+        results = {}
+        errors = {}
+        single_messages = {}
+        single_keys = {}
+        packs = []
+        pack: list[tuple] = []
+        pack_tokens = 0
+        for entry in entries:
+            if not entry.get("text"):
+                errors[entry["id"]] = "No page text"
+                continue
+            page_text = self.compactor.compact(entry["text"])
+            schema = entry.get("schema")
+            single_messages[entry["id"]] = self._text_messages(page_text, schema)
+            single_keys[entry["id"]] = self._text_messages(entry["text"], schema)
+            cached = self._cached(single_keys[entry["id"]], WithoutDownloadLinkResponse)
+            if cached is not None:
+                results[entry["id"]] = cached
+                continue
+
+            tokens = count_tokens(page_text) + count_tokens(schema or "")
+            if tokens > max_prompt_tokens // 2:
+                packs.append([(entry["id"], page_text, entry["text"], schema)])
+                continue
+            if pack and (
+                pack_tokens + tokens > max_prompt_tokens or len(pack) >= max_pages
+            ):
+                packs.append(pack)
+                pack, pack_tokens = [], 0
+            pack.append((entry["id"], page_text, entry["text"], schema))
+            pack_tokens += tokens
+        if pack:
+            packs.append(pack)
+
+        def single(dataset_id):
+            try:
+                results[dataset_id] = self._structured(
+                    single_messages[dataset_id],
+                    WithoutDownloadLinkResponse,
+                    single_keys[dataset_id],
+                )
+            except Exception as e:
+                errors[dataset_id] = str(e)
+
+        for pack in packs:
+            if len(pack) == 1:
+                single(pack[0][0])
+                continue
+            try:
+                response, model = self._cascade(
+                    self._packed_messages(
+                        [
+                            (dataset_id, page_text, schema)
+                            for dataset_id, page_text, _, schema in pack
+                        ]
+                    ),
+                    PackedResponse,
+                    self._packed_messages(
+                        [
+                            (dataset_id, text, schema)
+                            for dataset_id, _, text, schema in pack
+                        ]
+                    ),
+                )
+                by_id = {page.id: page for page in response.pages}
+            except Exception as e:
+                print(f"Packed call for {len(pack)} pages failed: {str(e)}")
+                by_id = {}
+            for dataset_id, *_ in pack:
+                if dataset_id not in by_id:
+                    single(dataset_id)
+                    continue
+                parsed = WithoutDownloadLinkResponse(
+                    title=by_id[dataset_id].title,
+                    description=by_id[dataset_id].description,
+                )
+                results[dataset_id] = parsed
+                if model is not None:
+                    self._store(
+                        model,
+                        single_keys[dataset_id],
+                        WithoutDownloadLinkResponse,
+                        parsed,
+                    )
+        print(
+            f"Analysed {len(entries)} pages in {len(packs)} packs "
+            f"({len(errors)} failed)"
         )
+        return results, errors
+
+    def batch_text_responses(
+        self,
+        entries: list[dict],
+        batch_dir: str = DEFAULT_BATCH_DIR,
+        poll_interval: float = 30.0,
+    ) -> tuple[dict[str, WithoutDownloadLinkResponse], dict[str, str]]:
+        """``get_text_response`` for many checkpoint entries as one batch job.
+
+        Cached entries are answered locally; the rest are submitted through
+        the Batch API and polled to completion. Returns parsed responses and
+        error messages, both keyed by dataset id.
+        """
+        # Batch jobs already trade latency for price, so they go straight to
+        # the most capable tier
+        model = self.models[-1]
+        results = {}
+        keys = {}
+        bodies = {}
+        errors = {}
+        for entry in entries:
+            if not entry.get("text"):
+                errors[entry["id"]] = "No page text"
+                continue
+            messages, key_messages = self._text_response_messages(
+                entry["text"], entry.get("schema")
+            )
+            key = response_key(model, key_messages, WithoutDownloadLinkResponse)
+            cached = self._cached(key_messages, WithoutDownloadLinkResponse)
+            if cached is not None:
+                results[entry["id"]] = cached
+                continue
+            keys[entry["id"]] = key
+            bodies[entry["id"]] = {
+                "model": model,
+                "messages": messages,
+                "response_format": type_to_response_format_param(
+                    WithoutDownloadLinkResponse
+                ),
+            }
+        print(f"{len(results)} responses cached, {len(bodies)} to batch")
+        if not bodies:
+            return results, errors
 
-        return completion.choices[0].message.parsed
+        runner = BatchRunner(self.openai_client, batch_dir, poll_interval)
+        responses, batch_errors = runner.run(bodies)
+        errors.update(batch_errors)
+        for dataset_id, body in responses.items():
+            message = body["choices"][0]["message"]
+            try:
+                if message.get("refusal"):
+                    raise ValueError(f"Refused: {message['refusal']}")
+                parsed = WithoutDownloadLinkResponse.model_validate_json(
+                    message["content"]
+                )
+            except Exception as e:
+                errors[dataset_id] = str(e)
+                continue
+            results[dataset_id] = parsed
+            if self.cache is not None:
+                self.cache.put(keys[dataset_id], model, parsed)
+        return results, errors
 
 
 # def test_data_response():
@@ -0,0 +1,145 @@
+import hashlib
+import json
+import os
+import time
+from typing import Dict, Optional
+
+from openai import OpenAI
+
+DEFAULT_BATCH_DIR = "scraper/cache/batches"
+# Batch API limits per input file
+MAX_BATCH_REQUESTS = 50_000
+MAX_BATCH_BYTES = 190 * 1024 * 1024
+TERMINAL_STATUSES = {"completed", "failed", "expired", "cancelled"}
+
+
+class BatchRunner:
+    """Runs chat completion requests through the OpenAI Batch API.
+
+    Requests are written to JSONL files (split to stay under the per-file
+    limits), uploaded and submitted as batch jobs, then polled until done.
+    Each submitted job's id is saved next to its input file, so rerunning an
+    interrupted backfill picks up the running jobs instead of paying twice.
+    """
+
+    def __init__(
+        self,
+        client: OpenAI,
+        batch_dir: str = DEFAULT_BATCH_DIR,
+        poll_interval: float = 30.0,
+        endpoint: str = "/v1/chat/completions",
+    ):
+        self.client = client
+        self.batch_dir = batch_dir
+        self.poll_interval = poll_interval
+        self.endpoint = endpoint
+        os.makedirs(batch_dir, exist_ok=True)
+
+    def _write_files(self, bodies: Dict[str, dict]) -> list[str]:
+        paths = []
+        lines: list[bytes] = []
+        size = 0
+
+        def flush():
+            data = b"".join(lines)
+            digest = hashlib.sha256(data).hexdigest()[:24]
+            path = os.path.join(self.batch_dir, f"{digest}.jsonl")
+            if not os.path.exists(path):
+                with open(path, "wb") as f:
+                    f.write(data)
+            paths.append(path)
+
+        for custom_id, body in bodies.items():
+            line = (
+                json.dumps(
+                    {
+                        "custom_id": custom_id,
+                        "method": "POST",
+                        "url": self.endpoint,
+                        "body": body,
+                    }
+                )
+                + "\n"
+            ).encode("utf-8")
+            if lines and (
+                len(lines) >= MAX_BATCH_REQUESTS or size + len(line) > MAX_BATCH_BYTES
+            ):
+                flush()
+                lines, size = [], 0
+            lines.append(line)
+            size += len(line)
+        if lines:
+            flush()
+        return paths
+
+    def _submit(self, path: str) -> str:
+        state_path = f"{path}.batch.json"
+        if os.path.exists(state_path):
+            with open(state_path, "r") as f:
+                batch_id = json.load(f)["batch_id"]
+            batch = self.client.batches.retrieve(batch_id)
+            # A job that died without output is resubmitted
+            if batch.status not in ("failed", "expired", "cancelled"):
+                print(f"Resuming batch {batch_id} for {path}")
+                return batch_id
+
+        with open(path, "rb") as f:
+            input_file = self.client.files.create(file=f, purpose="batch")
+        batch = self.client.batches.create(
+            input_file_id=input_file.id,
+            endpoint=self.endpoint,
+            completion_window="24h",
+        )
+        with open(state_path, "w") as f:
+            json.dump({"batch_id": batch.id, "input_file_id": input_file.id}, f)
+        print(f"Submitted batch {batch.id} for {path}")
+        return batch.id
+
+    def _wait(self, batch_id: str):
+        while True:
+            batch = self.client.batches.retrieve(batch_id)
+            counts = batch.request_counts
+            if counts is not None:
+                print(
+                    f"Batch {batch_id} {batch.status}: {counts.completed}/"
+                    f"{counts.total} done, {counts.failed} failed"
+                )
+            if batch.status in TERMINAL_STATUSES:
+                return batch
+            time.sleep(self.poll_interval)
+
+    def _read_lines(self, file_id: Optional[str]) -> list[dict]:
+        if not file_id:
+            return []
+        content = self.client.files.content(file_id).text
+        return [json.loads(line) for line in content.splitlines() if line.strip()]
+
+    def run(self, bodies: Dict[str, dict]) -> tuple[Dict[str, dict], Dict[str, str]]:
+        """Submit ``custom_id -> request body`` and wait for every job.
+
+        Returns the response bodies and the per-request errors, both keyed
+        by ``custom_id``.
+        """
+        batch_ids = [self._submit(path) for path in self._write_files(bodies)]
+        responses: Dict[str, dict] = {}
+        errors: Dict[str, str] = {}
+        for batch_id in batch_ids:
+            batch = self._wait(batch_id)
+            if batch.status != "completed":
+                print(f"Batch {batch_id} ended {batch.status}: {batch.errors}")
+            for line in self._read_lines(batch.output_file_id):
+                response = line.get("response") or {}
+                if response.get("status_code") == 200:
+                    responses[line["custom_id"]] = response["body"]
+                else:
+                    errors[line["custom_id"]] = json.dumps(
+                        line.get("error") or response.get("body")
+                    )
+            for line in self._read_lines(batch.error_file_id):
+                errors[line["custom_id"]] = json.dumps(
+                    line.get("error") or line.get("response")
+                )
+        for custom_id in bodies:
+            if custom_id not in responses and custom_id not in errors:
+                errors[custom_id] = "No result in batch output"
+        return responses, errors
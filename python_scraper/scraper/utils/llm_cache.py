@@ -0,0 +1,159 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Any, Optional, Type
+
+from pydantic import BaseModel, ValidationError
+
+DEFAULT_LLM_CACHE_PATH = "scraper/cache/llm_responses.sqlite3"
+DEFAULT_MAX_ENTRIES = 100_000
+# Page descriptions rarely change; re-ask the model after a month anyway
+DEFAULT_TTL = 30 * 24 * 3600
+WHITESPACE_PATTERN = re.compile(r"\s+")
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    model TEXT NOT NULL,
+    response TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    last_used REAL NOT NULL
+)
+"""
+
+
+def _normalize(value: Any) -> Any:
+    if isinstance(value, str):
+        return WHITESPACE_PATTERN.sub(" ", value).strip()
+    if isinstance(value, dict):
+        return {key: _normalize(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_normalize(item) for item in value]
+    return value
+
+
+def response_key(
+    model: str, messages: list[dict], response_format: Type[BaseModel]
+) -> str:
+    """Hash of the model, the response schema and the whitespace-normalized
+    messages, so cosmetic changes to scraped text still hit the cache."""
+    payload = json.dumps(
+        {
+            "model": model,
+            "schema": response_format.model_json_schema(),
+            "messages": _normalize(messages),
+        },
+        sort_keys=True,
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class LLMResponseCache:
+    """On-disk cache of parsed structured-output responses.
+
+    Values are stored as the pydantic model's JSON and validated back into
+    the requested response format. Entries older than ``ttl`` seconds are
+    treated as misses; past ``max_entries`` the least recently used go first.
+    """
+
+    def __init__(
+        self,
+        path: str = DEFAULT_LLM_CACHE_PATH,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+        ttl: float = DEFAULT_TTL,
+    ):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(SCHEMA)
+        self.conn.execute(
+            "CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)"
+        )
+        self.conn.commit()
+
+    def _lookup(
+        self, key: str, response_format: Type[BaseModel]
+    ) -> Optional[BaseModel]:
+        now = time.time()
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT response, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or now - row[1] > self.ttl:
+                return None
+            self.conn.execute(
+                "UPDATE responses SET last_used = ? WHERE key = ?", (now, key)
+            )
+            self.conn.commit()
+        try:
+            return response_format.model_validate_json(row[0])
+        except ValidationError:
+            return None
+
+    def get_any(
+        self, keys: list[str], response_format: Type[BaseModel]
+    ) -> Optional[BaseModel]:
+        """First live entry among ``keys``, counted as one hit or miss."""
+        for key in keys:
+            parsed = self._lookup(key, response_format)
+            if parsed is not None:
+                with self.lock:
+                    self.hits += 1
+                return parsed
+        with self.lock:
+            self.misses += 1
+        return None
+
+    def get(self, key: str, response_format: Type[BaseModel]) -> Optional[BaseModel]:
+        return self.get_any([key], response_format)
+
+    def put(self, key: str, model: str, response: BaseModel) -> None:
+        now = time.time()
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO responses "
+                "(key, model, response, created_at, last_used) VALUES (?, ?, ?, ?, ?)",
+                (key, model, response.model_dump_json(), now, now),
+            )
+            self._evict(now)
+            self.conn.commit()
+
+    def _evict(self, now: float) -> None:
+        self.conn.execute(
+            "DELETE FROM responses WHERE created_at < ?", (now - self.ttl,)
+        )
+        (count,) = self.conn.execute("SELECT COUNT(*) FROM responses").fetchone()
+        excess = count - self.max_entries
+        if excess > 0:
+            self.conn.execute(
+                "DELETE FROM responses WHERE rowid IN "
+                "(SELECT rowid FROM responses ORDER BY last_used ASC LIMIT ?)",
+                (excess,),
+            )
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+    def __len__(self) -> int:
+        with self.lock:
+            (count,) = self.conn.execute("SELECT COUNT(*) FROM responses").fetchone()
+        return count
+
+    def close(self) -> None:
+        self.conn.close()
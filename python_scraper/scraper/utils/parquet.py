@@ -0,0 +1,179 @@
+import os
+import re
+from datetime import date, datetime
+from typing import Dict, Optional
+
+import openpyxl
+import pyarrow as pa
+import pyarrow.csv as pacsv
+import pyarrow.parquet as pq
+from scraper.utils.utils import download_file, file_extension
+
+# Socrata exports timestamps as e.g. "2024/11/23 02:15:00 PM"
+TIMESTAMP_PARSERS = [
+    pacsv.ISO8601,
+    "%Y/%m/%d %I:%M:%S %p",
+    "%m/%d/%Y %I:%M:%S %p",
+    "%m/%d/%Y",
+]
+CSV_COLUMN_ERROR = re.compile(r"In CSV column #(\d+)")
+
+
+def _csv_to_parquet(
+    src_path: str, dest_path: str, block_size: int, compression: str
+) -> int:
+    # pyarrow infers column types from the first block. If a later block
+    # contradicts that (e.g. a zip code column that turns alphanumeric), the
+    # offending column is widened to string and the conversion restarts.
+    overrides: Dict[str, pa.DataType] = {}
+    while True:
+        reader = pacsv.open_csv(
+            src_path,
+            read_options=pacsv.ReadOptions(block_size=block_size),
+            # Socrata exports quote multi-line descriptions and addresses
+            parse_options=pacsv.ParseOptions(newlines_in_values=True),
+            convert_options=pacsv.ConvertOptions(
+                column_types=overrides,
+                timestamp_parsers=TIMESTAMP_PARSERS,
+                strings_can_be_null=True,
+            ),
+        )
+        rows = 0
+        try:
+            with pq.ParquetWriter(
+                dest_path, reader.schema, compression=compression
+            ) as writer:
+                for batch in reader:
+                    writer.write_batch(batch)
+                    rows += batch.num_rows
+            return rows
+        except pa.ArrowInvalid as e:
+            match = CSV_COLUMN_ERROR.search(str(e))
+            if not match:
+                raise
+            column = reader.schema.names[int(match.group(1))]
+            if column in overrides:
+                raise
+            print(f"Column {column!r} changes type mid-file, storing as string")
+            overrides[column] = pa.string()
+
+
+def _infer_xlsx_type(types: set) -> pa.DataType:
+    if not types:
+        return pa.string()
+    if types == {bool}:
+        return pa.bool_()
+    if types == {int}:
+        return pa.int64()
+    if types <= {int, float}:
+        return pa.float64()
+    if types <= {datetime, date}:
+        return pa.timestamp("us")
+    return pa.string()
+
+
+def _xlsx_to_parquet(
+    src_path: str, dest_path: str, chunk_rows: int, compression: str
+) -> int:
+    # Two streaming passes in openpyxl read-only mode: the first settles each
+    # column's type over the whole sheet, the second writes row chunks.
+    def open_rows():
+        workbook = openpyxl.load_workbook(src_path, read_only=True, data_only=True)
+        return workbook, workbook.active.iter_rows(values_only=True)
+
+    workbook, rows = open_rows()
+    header = next(rows, None)
+    if header is None:
+        workbook.close()
+        raise ValueError(f"{src_path} has no rows")
+    names = [
+        str(name) if name is not None else f"column_{i}"
+        for i, name in enumerate(header)
+    ]
+    column_types = [set() for _ in names]
+    for row in rows:
+        for types, value in zip(column_types, row):
+            if value is not None:
+                types.add(datetime if isinstance(value, datetime) else type(value))
+    workbook.close()
+
+    schema = pa.schema(
+        [(name, _infer_xlsx_type(types)) for name, types in zip(names, column_types)]
+    )
+
+    def convert(value, data_type):
+        if value is None:
+            return None
+        if data_type == pa.string():
+            return str(value)
+        if data_type == pa.float64():
+            return float(value)
+        if data_type == pa.timestamp("us") and not isinstance(value, datetime):
+            return datetime(value.year, value.month, value.day)
+        return value
+
+    workbook, rows = open_rows()
+    next(rows)
+    written = 0
+    with pq.ParquetWriter(dest_path, schema, compression=compression) as writer:
+        chunk = []
+
+        def flush():
+            columns = list(zip(*chunk)) if chunk else [[] for _ in names]
+            arrays = [
+                pa.array([convert(v, f.type) for v in column], type=f.type)
+                for column, f in zip(columns, schema)
+            ]
+            writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+
+        for row in rows:
+            # Pad short rows so every chunk has a value per column
+            chunk.append(tuple(row[: len(names)]) + (None,) * (len(names) - len(row)))
+            if len(chunk) >= chunk_rows:
+                flush()
+                written += len(chunk)
+                chunk = []
+        if chunk:
+            flush()
+            written += len(chunk)
+    workbook.close()
+    return written
+
+
+def convert_to_parquet(
+    src_path: str,
+    dest_path: Optional[str] = None,
+    chunk_rows: int = 100_000,
+    block_size: int = 16 * 1024 * 1024,
+    compression: str = "zstd",
+) -> str:
+    """Convert a downloaded CSV or XLSX dataset to typed, compressed Parquet.
+
+    Both formats are streamed in chunks, so memory is bounded by one block
+    (CSV) or ``chunk_rows`` rows (XLSX) rather than by the file size.
+    """
+    extension = file_extension(src_path)
+    dest_path = dest_path or f"{os.path.splitext(src_path)[0]}.parquet"
+    tmp_path = f"{dest_path}.part"
+    if extension == "csv":
+        rows = _csv_to_parquet(src_path, tmp_path, block_size, compression)
+    else:
+        rows = _xlsx_to_parquet(src_path, tmp_path, chunk_rows, compression)
+    os.replace(tmp_path, dest_path)
+    print(
+        f"Converted {src_path} to {dest_path}: {rows} rows, "
+        f"{os.path.getsize(src_path) / (1024 * 1024):.1f} MB -> "
+        f"{os.path.getsize(dest_path) / (1024 * 1024):.1f} MB"
+    )
+    return dest_path
+
+
+def download_as_parquet(
+    url: str, save_dir: Optional[str] = None, keep_source: bool = False
+) -> str:
+    """Download a dataset and convert it, returning the Parquet path."""
+    file_path, _ = download_file(url, save_dir)
+    parquet_path = convert_to_parquet(file_path)
+    if not keep_source:
+        os.remove(file_path)
+    return parquet_path
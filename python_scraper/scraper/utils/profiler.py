@@ -0,0 +1,193 @@
+import csv
+import io
+import re
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import requests
+from scraper.utils.rate_limit import call_with_backoff
+from scraper.utils.utils import http_session
+
+DEFAULT_HEAD_BYTES = 64 * 1024
+TIMESTAMP_FORMATS = [
+    "%Y/%m/%d %I:%M:%S %p",
+    "%m/%d/%Y %I:%M:%S %p",
+    "%Y-%m-%dT%H:%M:%S.%f",
+    "%Y-%m-%dT%H:%M:%S",
+    "%Y-%m-%d",
+    "%m/%d/%Y",
+]
+INTEGER_PATTERN = re.compile(r"^[+-]?\d+$")
+NUMBER_PATTERN = re.compile(r"^[+-]?(\d+\.?\d*|\.\d+)([eE][+-]?\d+)?$")
+POINT_PATTERN = re.compile(r"^POINT \(", re.IGNORECASE)
+
+
+@dataclass
+class ColumnProfile:
+    name: str
+    type: str
+    null_rate: float
+    samples: List[str] = field(default_factory=list)
+
+
+@dataclass
+class DatasetProfile:
+    url: str
+    columns: List[ColumnProfile]
+    rows_sampled: int
+    bytes_fetched: int
+    truncated: bool
+
+    @property
+    def column_names(self) -> List[str]:
+        return [column.name for column in self.columns]
+
+    def summary(self, max_samples: int = 3, max_sample_chars: int = 40) -> str:
+        """One line per column, compact enough to add to an LLM prompt."""
+        rows = f"{self.rows_sampled}{'+' if self.truncated else ''}"
+        lines = [f"{len(self.columns)} columns, sampled {rows} rows:"]
+        for column in self.columns:
+            line = f"- {column.name} ({column.type}"
+            if column.null_rate:
+                line += f", {column.null_rate:.0%} null"
+            line += ")"
+            samples = [s[:max_sample_chars] for s in column.samples[:max_samples]]
+            if samples:
+                line += f": {', '.join(samples)}"
+            lines.append(line)
+        return "\n".join(lines)
+
+
+def _is_timestamp(value: str) -> bool:
+    for fmt in TIMESTAMP_FORMATS:
+        try:
+            datetime.strptime(value, fmt)
+            return True
+        except ValueError:
+            continue
+    return False
+
+
+def infer_type(values: List[str]) -> str:
+    """Narrowest type that fits every non-empty value."""
+    if not values:
+        return "empty"
+    if all(v.lower() in ("true", "false") for v in values):
+        return "boolean"
+    if all(INTEGER_PATTERN.match(v) for v in values):
+        return "integer"
+    if all(NUMBER_PATTERN.match(v) for v in values):
+        return "number"
+    if all(_is_timestamp(v) for v in values):
+        return "timestamp"
+    if all(POINT_PATTERN.match(v) for v in values):
+        return "point"
+    return "text"
+
+
+def fetch_head(
+    url: str,
+    max_bytes: int = DEFAULT_HEAD_BYTES,
+    session: Optional[requests.Session] = None,
+    timeout: float = 30,
+) -> tuple[bytes, bool]:
+    """First ``max_bytes`` of ``url`` and whether the file continues past them.
+
+    Asks for a byte range; servers that ignore it (and stream the whole file
+    with a 200) are cut off after ``max_bytes``, so the cost is the same.
+    """
+
+    def fetch():
+        response = (session or http_session()).get(
+            url,
+            headers={"Range": f"bytes=0-{max_bytes - 1}"},
+            stream=True,
+            timeout=timeout,
+        )
+        with response:
+            if response.status_code == 416:
+                return b"", False
+            response.raise_for_status()
+            data = bytearray()
+            for chunk in response.iter_content(chunk_size=16 * 1024):
+                data.extend(chunk)
+                if len(data) >= max_bytes:
+                    break
+            total = response.headers.get("Content-Range", "").rpartition("/")[2]
+            if total.isdigit():
+                truncated = int(total) > max_bytes
+            else:
+                truncated = len(data) >= max_bytes
+            return bytes(data[:max_bytes]), truncated
+
+    return call_with_backoff("socrata", fetch, max_retries=3)
+
+
+def profile_csv_head(
+    data: bytes, truncated: bool, url: str = "", max_samples: int = 5
+) -> DatasetProfile:
+    text = data.decode("utf-8-sig", errors="replace")
+    if truncated:
+        # The last line was cut mid-record
+        text = text[: text.rfind("\n") + 1]
+    reader = csv.reader(io.StringIO(text))
+    header = next(reader, [])
+    rows = [row for row in reader if len(row) == len(header)]
+
+    columns = []
+    for i, name in enumerate(header):
+        values = [row[i].strip() for row in rows]
+        present = [v for v in values if v]
+        samples = list(dict.fromkeys(present))[:max_samples]
+        columns.append(
+            ColumnProfile(
+                name=name,
+                type=infer_type(present),
+                null_rate=(1 - len(present) / len(values)) if values else 0.0,
+                samples=samples,
+            )
+        )
+    return DatasetProfile(url, columns, len(rows), len(data), truncated)
+
+
+def profile_dataset(
+    url: str,
+    max_bytes: int = DEFAULT_HEAD_BYTES,
+    session: Optional[requests.Session] = None,
+) -> DatasetProfile:
+    """Profile a CSV from its first ``max_bytes`` without downloading it."""
+    data, truncated = fetch_head(url, max_bytes, session)
+    return profile_csv_head(data, truncated, url)
+
+
+def profile_entries(
+    entries: List[Dict], max_bytes: int = DEFAULT_HEAD_BYTES, max_workers: int = 8
+) -> List[Dict]:
+    """Attach ``schema`` summaries and ``columns`` to checkpoint entries.
+
+    Entries whose ``downloadUrl`` can't be profiled are left as they are.
+    """
+
+    def profile(entry):
+        if "schema" in entry or not entry.get("downloadUrl"):
+            return
+        try:
+            dataset_profile = profile_dataset(entry["downloadUrl"], max_bytes)
+        except Exception as e:
+            print(f"Could not profile {entry['downloadUrl']}: {e}")
+            return
+        entry["schema"] = dataset_profile.summary()
+        entry["columns"] = dataset_profile.column_names
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        list(executor.map(profile, entries))
+    return entries
+
+
+def embedding_text(description: str, columns: Optional[List[str]] = None) -> str:
+    """Description text to embed, with the column names appended if known."""
+    if not columns:
+        return description
+    return f"{description}\nColumns: {', '.join(columns)}"
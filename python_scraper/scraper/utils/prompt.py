@@ -0,0 +1,108 @@
+import re
+import threading
+from collections import Counter
+from functools import lru_cache
+from typing import Iterable, Optional
+
+import tiktoken
+
+# gpt-4o's tokenizer
+ENCODING_NAME = "o200k_base"
+DEFAULT_PROMPT_TOKENS = 4000
+WHITESPACE_PATTERN = re.compile(r"\s+")
+
+
+@lru_cache(maxsize=None)
+def get_encoding(name: str = ENCODING_NAME) -> tiktoken.Encoding:
+    return tiktoken.get_encoding(name)
+
+
+def count_tokens(text: str) -> int:
+    return len(get_encoding().encode(text, disallowed_special=()))
+
+
+def _normalize_line(line: str) -> str:
+    return WHITESPACE_PATTERN.sub(" ", line).strip()
+
+
+class PromptCompactor:
+    """Shrinks scraped page text before it goes into a prompt.
+
+    Lines that appear on at least ``boilerplate_ratio`` of the pages seen so
+    far (navigation, footers, cookie banners) are dropped, as are repeated
+    lines within a page. What remains is cut at a line boundary to fit
+    ``max_tokens`` as counted by the model's tokenizer. Pages are learned as
+    they are compacted; ``fit`` primes the counts with a whole crawl up front.
+    """
+
+    def __init__(
+        self,
+        max_tokens: int = DEFAULT_PROMPT_TOKENS,
+        boilerplate_ratio: float = 0.5,
+        min_pages: int = 5,
+    ):
+        self.max_tokens = max_tokens
+        self.boilerplate_ratio = boilerplate_ratio
+        self.min_pages = min_pages
+        self.line_counts: Counter = Counter()
+        self.pages_seen = 0
+        self._observed: set[int] = set()
+        self.tokens_in = 0
+        self.tokens_out = 0
+        self.lock = threading.Lock()
+
+    def observe(self, text: str) -> None:
+        lines = {_normalize_line(line) for line in text.splitlines()}
+        lines.discard("")
+        with self.lock:
+            # A page primed by ``fit`` is not counted again when compacted
+            if hash(text) in self._observed:
+                return
+            self._observed.add(hash(text))
+            self.line_counts.update(lines)
+            self.pages_seen += 1
+
+    def fit(self, texts: Iterable[str]) -> "PromptCompactor":
+        for text in texts:
+            self.observe(text)
+        return self
+
+    def is_boilerplate(self, line: str) -> bool:
+        if self.pages_seen < self.min_pages:
+            return False
+        return self.line_counts[line] / self.pages_seen >= self.boilerplate_ratio
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        encoding = get_encoding()
+        tokens = encoding.encode(text, disallowed_special=())
+        if len(tokens) <= max_tokens:
+            return text
+        head = encoding.decode(tokens[:max_tokens])
+        cut = head.rfind("\n")
+        return head[:cut] if cut > 0 else head
+
+    def compact(self, text: str, max_tokens: Optional[int] = None) -> str:
+        self.observe(text)
+        seen = set()
+        lines = []
+        for line in text.splitlines():
+            line = _normalize_line(line)
+            if not line or line in seen or self.is_boilerplate(line):
+                continue
+            seen.add(line)
+            lines.append(line)
+        compacted = self.truncate("\n".join(lines), max_tokens or self.max_tokens)
+
+        tokens_in, tokens_out = count_tokens(text), count_tokens(compacted)
+        with self.lock:
+            self.tokens_in += tokens_in
+            self.tokens_out += tokens_out
+        return compacted
+
+    def stats(self) -> dict:
+        return {
+            "pages": self.pages_seen,
+            "tokens_in": self.tokens_in,
+            "tokens_out": self.tokens_out,
+            "ratio": self.tokens_out / self.tokens_in if self.tokens_in else 1.0,
+        }
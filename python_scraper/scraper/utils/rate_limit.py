@@ -0,0 +1,187 @@
+import asyncio
+import os
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Any, Callable, Optional
+
+import openai
+import requests
+
+# Requests per second and burst size per service. Override with e.g.
+# RATE_LIMIT_OPENAI_RPS=20 RATE_LIMIT_OPENAI_BURST=40.
+DEFAULT_LIMITS = {
+    "openai": (8.0, 16),
+    "voyage": (4.0, 8),
+    "browserbase": (2.0, 4),
+    "socrata": (5.0, 10),
+}
+
+RETRYABLE_STATUS = {408, 409, 425, 429, 500, 502, 503, 504}
+# Dropped connections and timeouts never reach a status code. APITimeoutError
+# subclasses APIConnectionError.
+TRANSIENT_ERRORS = (
+    openai.APIConnectionError,
+    requests.ConnectionError,
+    requests.Timeout,
+    ConnectionError,
+    TimeoutError,
+)
+
+
+class TokenBucket:
+    """Thread-safe token bucket shared by every caller of one service.
+
+    A 429 with ``Retry-After`` pauses the whole bucket, so concurrent callers
+    back off together instead of each discovering the limit separately.
+    """
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.lock = threading.Lock()
+
+    def _reserve(self, cost: float) -> float:
+        """Take ``cost`` tokens and return how long the caller must wait."""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(
+                self.capacity, self.tokens + (now - self.updated) * self.rate
+            )
+            self.updated = now
+            self.tokens -= cost
+            wait = max(0.0, -self.tokens / self.rate)
+            return max(wait, self.paused_until - now)
+
+    def acquire(self, cost: float = 1) -> None:
+        wait = self._reserve(cost)
+        if wait > 0:
+            time.sleep(wait)
+
+    async def aacquire(self, cost: float = 1) -> None:
+        wait = self._reserve(cost)
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def pause(self, seconds: float) -> None:
+        with self.lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+
+_buckets: dict[str, TokenBucket] = {}
+_buckets_lock = threading.Lock()
+
+
+def get_bucket(service: str) -> TokenBucket:
+    with _buckets_lock:
+        if service not in _buckets:
+            rate, burst = DEFAULT_LIMITS.get(service, (5.0, 10))
+            prefix = f"RATE_LIMIT_{service.upper()}"
+            _buckets[service] = TokenBucket(
+                float(os.getenv(f"{prefix}_RPS", rate)),
+                int(os.getenv(f"{prefix}_BURST", burst)),
+            )
+        return _buckets[service]
+
+
+def _status_and_headers(error: Exception) -> tuple[Optional[int], Any]:
+    # openai/httpx and requests errors carry a response; voyageai errors carry
+    # the status and headers directly.
+    response = getattr(error, "response", None)
+    status = getattr(error, "status_code", None) or getattr(error, "http_status", None)
+    headers = getattr(error, "headers", None)
+    if response is not None:
+        status = status or getattr(response, "status_code", None)
+        headers = headers or getattr(response, "headers", None)
+    return status, headers
+
+
+def is_retryable(error: Exception) -> bool:
+    if isinstance(error, TRANSIENT_ERRORS):
+        return True
+    status, _ = _status_and_headers(error)
+    if status is not None:
+        return status in RETRYABLE_STATUS
+    # A bare "429" could be part of an id, URL or byte count
+    return "Too Many Requests" in str(error)
+
+
+def retry_after(error: Exception) -> Optional[float]:
+    """Seconds requested by a ``Retry-After`` header, if the error has one."""
+    _, headers = _status_and_headers(error)
+    if not headers:
+        return None
+    value = headers.get("retry-after") or headers.get("Retry-After")
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
+
+def backoff_delay(attempt: int, base: float = 1.0, cap: float = 60.0) -> float:
+    """Full-jitter exponential backoff."""
+    return random.uniform(0, min(cap, base * 2**attempt))
+
+
+def _retry_delay(
+    service: str, error: Exception, attempt: int, base_delay: float
+) -> float:
+    requested = retry_after(error)
+    if requested is not None:
+        get_bucket(service).pause(requested)
+        return requested
+    return backoff_delay(attempt, base=base_delay)
+
+
+def call_with_backoff(
+    service: str,
+    fn: Callable,
+    *args,
+    max_retries: int = 5,
+    cost: float = 1,
+    base_delay: float = 1.0,
+    **kwargs,
+):
+    """Call ``fn`` under ``service``'s rate limit, retrying retryable errors."""
+    bucket = get_bucket(service)
+    for attempt in range(max_retries + 1):
+        bucket.acquire(cost)
+        try:
+            return fn(*args, **kwargs)
+        except Exception as e:
+            if attempt == max_retries or not is_retryable(e):
+                raise
+            delay = _retry_delay(service, e, attempt, base_delay)
+            print(f"{service} call failed ({e}); retry {attempt + 1} in {delay:.1f}s")
+            time.sleep(delay)
+
+
+async def acall_with_backoff(
+    service: str,
+    fn: Callable,
+    *args,
+    max_retries: int = 5,
+    cost: float = 1,
+    base_delay: float = 1.0,
+    **kwargs,
+):
+    bucket = get_bucket(service)
+    for attempt in range(max_retries + 1):
+        await bucket.aacquire(cost)
+        try:
+            return await fn(*args, **kwargs)
+        except Exception as e:
+            if attempt == max_retries or not is_retryable(e):
+                raise
+            delay = _retry_delay(service, e, attempt, base_delay)
+            print(f"{service} call failed ({e}); retry {attempt + 1} in {delay:.1f}s")
+            await asyncio.sleep(delay)
@@ -0,0 +1,165 @@
+import base64
+import hashlib
+import json
+import os
+import time
+from typing import Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from scraper.utils.rate_limit import backoff_delay
+
+# Supabase Storage requires every TUS chunk except the last to be exactly 6MB
+TUS_CHUNK_SIZE = 6 * 1024 * 1024
+
+
+def _encode_metadata(metadata: dict) -> str:
+    return ",".join(
+        f"{key} {base64.b64encode(str(value).encode('utf-8')).decode('ascii')}"
+        for key, value in metadata.items()
+    )
+
+
+class ResumableUploader:
+    """TUS 1.0 client for Supabase Storage's resumable upload endpoint.
+
+    Files are read from disk one chunk at a time, so memory stays at
+    ``chunk_size`` whatever the file size. Each upload's URL is remembered in
+    ``state_dir``; rerunning the same upload asks the server for its offset
+    and continues from there, and a failed chunk is retried from the offset
+    the server reports.
+    """
+
+    def __init__(
+        self,
+        endpoint: str,
+        api_key: str,
+        state_dir: str = "scraper/cache/uploads",
+        chunk_size: int = TUS_CHUNK_SIZE,
+        max_retries: int = 5,
+        timeout: float = 120,
+    ):
+        self.endpoint = endpoint
+        self.chunk_size = chunk_size
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.state_dir = state_dir
+        os.makedirs(state_dir, exist_ok=True)
+        self.session = requests.Session()
+        self.session.mount("https://", HTTPAdapter(pool_maxsize=16))
+        self.session.mount("http://", HTTPAdapter(pool_maxsize=16))
+        self.headers = {
+            "Authorization": f"Bearer {api_key}",
+            "Tus-Resumable": "1.0.0",
+        }
+
+    def _state_path(self, bucket_name: str, object_path: str, file_path: str) -> str:
+        stat = os.stat(file_path)
+        key = f"{bucket_name}/{object_path}:{stat.st_size}:{stat.st_mtime_ns}"
+        digest = hashlib.sha256(key.encode("utf-8")).hexdigest()[:24]
+        return os.path.join(self.state_dir, f"{digest}.json")
+
+    def _create(
+        self, bucket_name: str, object_path: str, size: int, content_type: str
+    ) -> str:
+        response = self.session.post(
+            self.endpoint,
+            headers={
+                **self.headers,
+                "Upload-Length": str(size),
+                "Upload-Metadata": _encode_metadata(
+                    {
+                        "bucketName": bucket_name,
+                        "objectName": object_path,
+                        "contentType": content_type,
+                        "cacheControl": "3600",
+                    }
+                ),
+                "x-upsert": "true",
+            },
+            timeout=self.timeout,
+        )
+        response.raise_for_status()
+        location = response.headers["Location"]
+        return requests.compat.urljoin(self.endpoint, location)
+
+    def _offset(self, upload_url: str) -> Optional[int]:
+        """Server-side offset of an upload, or ``None`` if it has expired."""
+        response = self.session.head(
+            upload_url, headers=self.headers, timeout=self.timeout
+        )
+        if response.status_code in (404, 410):
+            return None
+        response.raise_for_status()
+        return int(response.headers["Upload-Offset"])
+
+    def _patch(self, upload_url: str, offset: int, chunk: bytes) -> int:
+        response = self.session.patch(
+            upload_url,
+            data=chunk,
+            headers={
+                **self.headers,
+                "Upload-Offset": str(offset),
+                "Content-Type": "application/offset+octet-stream",
+            },
+            timeout=self.timeout,
+        )
+        response.raise_for_status()
+        return int(response.headers["Upload-Offset"])
+
+    def upload(
+        self,
+        bucket_name: str,
+        file_path: str,
+        object_path: str,
+        content_type: str = "text/csv",
+    ) -> str:
+        size = os.path.getsize(file_path)
+        state_path = self._state_path(bucket_name, object_path, file_path)
+
+        upload_url = None
+        offset = None
+        if os.path.exists(state_path):
+            with open(state_path, "r") as f:
+                upload_url = json.load(f)["upload_url"]
+            offset = self._offset(upload_url)
+            if offset is not None:
+                print(f"Resuming upload of {file_path} at {offset / 2**20:.1f} MB")
+        if offset is None:
+            upload_url = self._create(bucket_name, object_path, size, content_type)
+            offset = 0
+            with open(state_path, "w") as f:
+                json.dump({"upload_url": upload_url, "file_path": file_path}, f)
+
+        start = time.monotonic()
+        sent = 0
+        with open(file_path, "rb") as f:
+            while offset < size:
+                f.seek(offset)
+                chunk = f.read(self.chunk_size)
+                for attempt in range(self.max_retries):
+                    try:
+                        if attempt:
+                            # The server may have stored part of the chunk
+                            new_offset = self._offset(upload_url)
+                            if new_offset is None:
+                                raise Exception(f"Upload {upload_url} has expired")
+                            if new_offset != offset:
+                                break
+                        new_offset = self._patch(upload_url, offset, chunk)
+                        break
+                    except requests.RequestException as e:
+                        if attempt == self.max_retries - 1:
+                            raise
+                        print(f"Chunk at {offset} failed ({e}), retrying")
+                        time.sleep(backoff_delay(attempt))
+                sent += new_offset - offset
+                offset = new_offset
+
+        os.remove(state_path)
+        elapsed = time.monotonic() - start
+        print(
+            f"Uploaded {file_path} to {bucket_name}/{object_path}: "
+            f"{sent / 2**20:.1f} MB at {sent / 2**20 / max(elapsed, 1e-9):.1f} MB/s"
+        )
+        return object_path
@@ -0,0 +1,213 @@
+import json
+import os
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from scraper.utils.vector_index import VectorIndex, load_rows, normalize, top_k
+
+
+def _write_json_atomic(path: str, data) -> None:
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+class Segment:
+    def __init__(self, root: str, name: str):
+        self.root = root
+        self.name = name
+        # Read-only memory map: opening is O(1) and pages are shared between
+        # every process that maps the same file.
+        self.vectors = np.load(self.path(".npy"), mmap_mode="r")
+        with open(self.path(".ids.json"), "r") as f:
+            self.ids = json.load(f)
+        self.live = np.ones(len(self.ids), dtype=bool)
+
+    def path(self, suffix: str) -> str:
+        return os.path.join(self.root, f"{self.name}{suffix}")
+
+    def metadata(self) -> List[Dict[str, Any]]:
+        with open(self.path(".meta.jsonl"), "r") as f:
+            return [json.loads(line) for line in f]
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+
+class SegmentStore:
+    """Append-only store of normalized float32 embeddings.
+
+    Each append writes an immutable segment: ``<name>.npy`` with the vectors,
+    ``<name>.ids.json`` and ``<name>.meta.jsonl`` sidecars. ``manifest.json``
+    lists the live segments and is replaced atomically, so readers never see
+    a half-written segment. Re-appended ids shadow older rows until
+    :meth:`compact` merges everything into a single segment.
+    """
+
+    def __init__(self, root: str, dim: Optional[int] = None, max_segments: int = 16):
+        self.root = root
+        self.max_segments = max_segments
+        os.makedirs(root, exist_ok=True)
+        manifest_path = os.path.join(root, "manifest.json")
+        if os.path.exists(manifest_path):
+            with open(manifest_path, "r") as f:
+                self.manifest = json.load(f)
+        else:
+            self.manifest = {"dim": dim, "segments": [], "next_segment": 1}
+        if dim is not None and self.manifest["dim"] not in (None, dim):
+            raise ValueError(
+                f"Store at {root} holds {self.manifest['dim']}-d vectors, not {dim}-d"
+            )
+        self._load_segments()
+
+    def _load_segments(self) -> None:
+        self.segments = [Segment(self.root, name) for name in self.manifest["segments"]]
+        # Newer segments win for ids that were appended more than once
+        seen = set()
+        for segment in reversed(self.segments):
+            for i, id in enumerate(segment.ids):
+                if id in seen:
+                    segment.live[i] = False
+                seen.add(id)
+
+    def _save_manifest(self) -> None:
+        _write_json_atomic(os.path.join(self.root, "manifest.json"), self.manifest)
+
+    @property
+    def dim(self) -> Optional[int]:
+        return self.manifest["dim"]
+
+    def __len__(self) -> int:
+        return sum(int(segment.live.sum()) for segment in self.segments)
+
+    def _write_segment(
+        self, ids: List[str], vectors: np.ndarray, metadata: List[Dict[str, Any]]
+    ) -> str:
+        name = f"seg-{self.manifest['next_segment']:06d}"
+        self.manifest["next_segment"] += 1
+        base = os.path.join(self.root, name)
+        # np.save appends .npy to names without it, so keep the suffix last
+        np.save(f"{base}.tmp.npy", vectors)
+        os.replace(f"{base}.tmp.npy", f"{base}.npy")
+        _write_json_atomic(f"{base}.ids.json", ids)
+        with open(f"{base}.meta.jsonl.tmp", "w") as f:
+            for row in metadata:
+                f.write(json.dumps(row) + "\n")
+        os.replace(f"{base}.meta.jsonl.tmp", f"{base}.meta.jsonl")
+        return name
+
+    def append(
+        self,
+        ids: List[str],
+        vectors,
+        metadata: Optional[List[Dict[str, Any]]] = None,
+    ) -> str:
+        vectors = normalize(np.atleast_2d(vectors))
+        if len(ids) != len(vectors):
+            raise ValueError(f"Got {len(ids)} ids for {len(vectors)} vectors")
+        if self.dim is None:
+            self.manifest["dim"] = int(vectors.shape[1])
+        elif vectors.shape[1] != self.dim:
+            raise ValueError(f"Expected {self.dim}-d vectors, got {vectors.shape[1]}-d")
+
+        name = self._write_segment(list(ids), vectors, metadata or [{} for _ in ids])
+        self.manifest["segments"].append(name)
+        self._save_manifest()
+        self._load_segments()
+
+        if len(self.segments) > self.max_segments:
+            self.compact()
+        return name
+
+    def append_rows(
+        self,
+        rows: List[Dict[str, Any]],
+        field: str = "title_vector",
+        id_field: str = "id",
+    ) -> str:
+        """Append rows shaped like the ``sf_csv_data`` table."""
+        rows = [row for row in rows if row and row.get(field)]
+        return self.append(
+            [row.get(id_field) or row.get("url") for row in rows],
+            np.array([row[field] for row in rows], dtype=np.float32),
+            [
+                {k: v for k, v in row.items() if not k.endswith("_vector")}
+                for row in rows
+            ],
+        )
+
+    def compact(self) -> None:
+        """Merge all segments into one, dropping shadowed rows."""
+        if len(self.segments) <= 1 and all(s.live.all() for s in self.segments):
+            return
+        ids = []
+        metadata = []
+        for segment in self.segments:
+            segment_metadata = segment.metadata()
+            for i in np.flatnonzero(segment.live):
+                ids.append(segment.ids[i])
+                metadata.append(segment_metadata[i])
+        vectors = np.concatenate(
+            [segment.vectors[segment.live] for segment in self.segments]
+        )
+
+        old_segments = self.segments
+        self.manifest["segments"] = [self._write_segment(ids, vectors, metadata)]
+        self._save_manifest()
+        self._load_segments()
+        # Readers that still map the old files keep their pages until they
+        # close them, so unlinking is safe here.
+        for segment in old_segments:
+            for suffix in (".npy", ".ids.json", ".meta.jsonl"):
+                os.remove(segment.path(suffix))
+
+    def search(self, query, k: int = 10) -> List[tuple[str, float]]:
+        return self.search_batch([query], k)[0]
+
+    def search_batch(self, queries, k: int = 10) -> List[List[tuple[str, float]]]:
+        """Exact cosine search that scans each mapped segment in place."""
+        queries = normalize(np.atleast_2d(queries))
+        candidates = [[] for _ in queries]
+        for segment in self.segments:
+            scores = queries @ segment.vectors.T
+            scores[:, ~segment.live] = -np.inf
+            indices, top_scores = top_k(scores, k)
+            for row, row_indices, row_scores in zip(candidates, indices, top_scores):
+                row.extend(
+                    (segment.ids[i], float(s))
+                    for i, s in zip(row_indices, row_scores)
+                    if np.isfinite(s)
+                )
+        return [sorted(row, key=lambda x: -x[1])[:k] for row in candidates]
+
+    def to_index(self) -> VectorIndex:
+        """Load the live rows into a :class:`VectorIndex`.
+
+        A compacted single-segment store is wrapped without copying.
+        """
+        if not self.segments:
+            return VectorIndex([], np.empty((0, self.dim or 0), dtype=np.float32))
+        if len(self.segments) == 1 and self.segments[0].live.all():
+            segment = self.segments[0]
+            return VectorIndex(segment.ids, segment.vectors, normalized=True)
+        ids = [
+            id
+            for segment in self.segments
+            for id, live in zip(segment.ids, segment.live)
+            if live
+        ]
+        vectors = np.concatenate([s.vectors[s.live] for s in self.segments])
+        return VectorIndex(ids, vectors, normalized=True)
+
+
+if __name__ == "__main__":
+    import sys
+
+    # Import ingest results: segment_store.py <uploaded_data.jsonl> <store_dir> [field]
+    json_file_path, store_dir = sys.argv[1], sys.argv[2]
+    field = sys.argv[3] if len(sys.argv) > 3 else "title_vector"
+    store = SegmentStore(store_dir)
+    store.append_rows(load_rows(json_file_path), field=field)
+    store.compact()
+    print(f"Stored {len(store)} {field} rows in {store_dir}")
@@ -0,0 +1,158 @@
+import re
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+from urllib.parse import quote, urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from scraper.utils.rate_limit import call_with_backoff
+
+DEFAULT_DOMAIN = "data.sfgov.org"
+DATASET_ID_PATTERN = re.compile(r"(?:^|/)([a-z0-9]{4}-[a-z0-9]{4})(?:/|$|\?)")
+DOWNLOAD_PATTERN = re.compile(r"\.(xlsx|csv)$", re.IGNORECASE)
+# Views without rows: rows.csv 404s for uploaded files, external links and maps
+NON_TABULAR_ASSETS = {"file", "href", "map"}
+
+
+def dataset_id_from_url(url: str) -> Optional[str]:
+    match = DATASET_ID_PATTERN.search(url)
+    return match.group(1) if match else None
+
+
+class SocrataClient:
+    """Plain-HTTP client for Socrata's ``/api/views/{id}.json`` metadata.
+
+    A dataset's view JSON carries the same title, description, columns and
+    attachments a rendered page shows, at a few KB per request. One pooled
+    session is shared across threads so connections stay alive.
+    """
+
+    def __init__(
+        self, domain: str = DEFAULT_DOMAIN, pool_size: int = 16, timeout: float = 15
+    ):
+        self.domain = domain
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def _base_url(self, url: Optional[str] = None) -> str:
+        if url and urlparse(url).netloc:
+            parsed = urlparse(url)
+            return f"{parsed.scheme}://{parsed.netloc}"
+        return f"https://{self.domain}"
+
+    def get_view(self, dataset_id: str, url: Optional[str] = None) -> Dict[str, Any]:
+        def fetch():
+            response = self.session.get(
+                f"{self._base_url(url)}/api/views/{dataset_id}.json",
+                timeout=self.timeout,
+            )
+            response.raise_for_status()
+            return response.json()
+
+        return call_with_backoff("socrata", fetch, max_retries=3)
+
+    @staticmethod
+    def is_tabular(view: Dict[str, Any]) -> bool:
+        return (
+            view.get("viewType", "tabular") == "tabular"
+            and view.get("assetType") not in NON_TABULAR_ASSETS
+        )
+
+    def download_links(
+        self, view: Dict[str, Any], url: Optional[str] = None
+    ) -> List[str]:
+        """CSV/XLSX downloads for a view; empty if the API does not list any."""
+        base_url = self._base_url(url)
+        files_url = f"{base_url}/api/views/{view['id']}/files"
+        metadata = view.get("metadata") or {}
+        links = []
+        if self.is_tabular(view):
+            links.append(f"{base_url}/api/views/{view['id']}/rows.csv")
+        elif view.get("blobId") and DOWNLOAD_PATTERN.search(
+            view.get("blobFilename", "")
+        ):
+            links.append(
+                f"{files_url}/{view['blobId']}"
+                f"?download=true&filename={quote(view['blobFilename'])}"
+            )
+        for format_name, access_url in (metadata.get("accessPoints") or {}).items():
+            if format_name.lower() in ("csv", "xlsx") or DOWNLOAD_PATTERN.search(
+                urlparse(access_url).path
+            ):
+                links.append(access_url)
+        for attachment in metadata.get("attachments", []):
+            filename = attachment.get("filename", "")
+            if attachment.get("assetId") and DOWNLOAD_PATTERN.search(filename):
+                links.append(
+                    f"{files_url}/{attachment['assetId']}"
+                    f"?download=true&filename={quote(filename)}"
+                )
+        return list(dict.fromkeys(links))
+
+    @staticmethod
+    def page_text(view: Dict[str, Any]) -> str:
+        """Render view metadata as the text the LLM would otherwise scrape."""
+        lines = [view.get("name", "")]
+        for label, key in (
+            ("Description", "description"),
+            ("Category", "category"),
+            ("Provided by", "attribution"),
+        ):
+            if view.get(key):
+                lines.append(f"{label}: {view[key]}")
+        tags = view.get("tags") or []
+        if tags:
+            lines.append(f"Tags: {', '.join(tags)}")
+        columns = view.get("columns") or []
+        if columns:
+            lines.append("Columns:")
+            for column in columns:
+                line = f"- {column.get('name')} ({column.get('dataTypeName')})"
+                if column.get("description"):
+                    line += f": {column['description']}"
+                lines.append(line)
+        return "\n".join(lines)
+
+    def get_dataset(self, url: str) -> Dict[str, Any]:
+        dataset_id = dataset_id_from_url(url)
+        if dataset_id is None:
+            raise ValueError(f"No Socrata dataset id in {url}")
+        view = self.get_view(dataset_id, url)
+        links = self.download_links(view, url)
+        return {
+            "id": dataset_id,
+            "url": url,
+            "title": view.get("name"),
+            "description": view.get("description", ""),
+            "downloadUrl": links[0] if links else None,
+            "download_links": links,
+            "text": self.page_text(view),
+        }
+
+    def get_datasets(
+        self, urls: List[str], max_workers: int = 8
+    ) -> List[Optional[Dict[str, Any]]]:
+        """Fetch many datasets concurrently; failures come back as ``None``."""
+
+        def fetch(url):
+            try:
+                return self.get_dataset(url)
+            except Exception as e:
+                print(f"Socrata metadata failed for {url}: {e}")
+                return None
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            return list(executor.map(fetch, urls))
+
+
+_default_client: Optional[SocrataClient] = None
+
+
+def default_client() -> SocrataClient:
+    global _default_client
+    if _default_client is None:
+        _default_client = SocrataClient()
+    return _default_client
@@ -1,27 +1,67 @@
+import asyncio
+import json
 import os
-from typing import Any, Dict, List
-from uuid import uuid4
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+from uuid import NAMESPACE_URL, uuid4, uuid5
 
-import requests
 from dotenv import load_dotenv
-from scraper.utils.utils import download_file
+from scraper.utils.rate_limit import backoff_delay
+from scraper.utils.resumable_upload import ResumableUploader
+from scraper.utils.utils import file_extension, stream_download
 from supabase import create_client
 
 load_dotenv()
 
+# Postgres SQLSTATE classes raised by the rows themselves: data exceptions
+# and constraint violations. Schema errors fail every row, so they are not
+# worth bisecting.
+ROW_ERROR_SQLSTATES = ("22", "23")
+PAYLOAD_TOO_LARGE = ("Payload Too Large", "Request Entity Too Large")
+
+
+def _is_row_error(error: Exception) -> bool:
+    """Whether retrying the same rows is pointless but a smaller chunk may
+    succeed: the payload is too large or Postgres rejected one of them."""
+    response = getattr(error, "response", None)
+    status = getattr(error, "status_code", None) or getattr(
+        response, "status_code", None
+    )
+    if status == 413 or any(text in str(error) for text in PAYLOAD_TOO_LARGE):
+        return True
+    code = str(getattr(error, "code", None) or "")
+    return code[:2] in ROW_ERROR_SQLSTATES
+
 
 class SupabaseClient:
     def __init__(self):
         supabase_url = os.getenv("SUPABASE_URL")
         supabase_key = os.getenv("SUPABASE_SERVICE_KEY")
         self.client = create_client(supabase_url, supabase_key)
+        self.uploader = ResumableUploader(
+            f"{supabase_url}/storage/v1/upload/resumable", supabase_key
+        )
 
     def upsert_embeddings(self, table_name: str, data: List[Dict[Any, Any]]) -> None:
         try:
             print(f"Upserting {len(data)} embeddings to {table_name}")
             self.client.table(table_name).upsert(data).execute()
         except Exception as e:
-            raise Exception(f"Failed to upsert embeddings to {table_name}: {str(e)}")
+            raise Exception(
+                f"Failed to upsert embeddings to {table_name}: {str(e)}"
+            ) from e
+
+    def batch_writer(self, table_name: str, **kwargs) -> "BatchWriter":
+        return BatchWriter(self, table_name, **kwargs)
+
+    async def aupsert_embeddings(
+        self, table_name: str, data: List[Dict[Any, Any]]
+    ) -> None:
+        # supabase-py's sync client does blocking HTTP; run it off the event
+        # loop so upserts overlap with the other pipeline stages.
+        await asyncio.to_thread(self.upsert_embeddings, table_name, data)
 
     def match_embeddings(
         self, table_name: str, query_embedding: List[float], match_count: int = 5
@@ -74,6 +114,59 @@ class SupabaseClient:
         except Exception as e:
             raise Exception(f"Failed to upload CSV to bucket {bucket_name}: {str(e)}")
 
+    def upload_file_to_bucket(
+        self,
+        bucket_name: str,
+        file_path: str,
+        folder_path: str,
+        title: str,
+    ) -> str:
+        """Upload a local CSV/XLSX in resumable chunks, streaming from disk."""
+        print(f"uploading {file_path} to {bucket_name}")
+        print(f"File size: {os.path.getsize(file_path) / (1024 * 1024):.2f} MB")
+        try:
+            extension = file_extension(file_path)
+            normalized_title = (
+                title.lower().replace(" ", "_").replace("/", "_").replace(".", "_")
+            )
+            # Derive the name from the file contents' identity rather than a
+            # random uuid, so a rerun resumes the same upload.
+            stat = os.stat(file_path)
+            identity = f"{file_path}:{stat.st_size}:{stat.st_mtime_ns}"
+            suffix = uuid5(NAMESPACE_URL, identity)
+            full_path = f"{folder_path}/{normalized_title}_{suffix}.{extension}"
+            content_type = (
+                "text/csv"
+                if extension == "csv"
+                else "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+            )
+            return self.uploader.upload(bucket_name, file_path, full_path, content_type)
+        except Exception as e:
+            raise Exception(f"Failed to upload {file_path} to {bucket_name}: {str(e)}")
+
+    def upload_files_to_bucket(
+        self,
+        bucket_name: str,
+        files: List[tuple[str, str]],
+        folder_path: str,
+        max_workers: int = 4,
+    ) -> Dict[str, Any]:
+        """Upload ``(file_path, title)`` pairs in parallel. Returns each file's
+        object path, or the exception it failed with."""
+
+        def upload(item):
+            file_path, title = item
+            try:
+                return self.upload_file_to_bucket(
+                    bucket_name, file_path, folder_path, title
+                )
+            except Exception as e:
+                print(str(e))
+                return e
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            return dict(zip([f for f, _ in files], executor.map(upload, files)))
+
     def download_csv_to_local(
         self,
         url: str,
@@ -82,29 +175,151 @@ class SupabaseClient:
     ) -> str:
         print("Downloading CSV to local file")
         try:
-            response = requests.get(url, stream=True)
-            response.raise_for_status()
-
-            file_extension = url.split(".")[-1].lower()
-            if file_extension not in ["csv", "xlsx"]:
-                raise ValueError("File must be a .csv or .xlsx file")
+            extension = file_extension(url)
 
             normalized_title = (
                 title.lower().replace(" ", "_").replace("/", "_").replace(".", "_")
             )
-            full_path = (
-                f"{folder_path}/{normalized_title}_{str(uuid4())}.{file_extension}"
-            )
-
-            with open(full_path, "wb") as f:
-                for chunk in response.iter_content(chunk_size=8192):
-                    f.write(chunk)
+            full_path = f"{folder_path}/{normalized_title}_{str(uuid4())}.{extension}"
 
+            stream_download(url, full_path)
             return full_path
         except Exception as e:
             raise Exception(f"Failed to download CSV to local: {str(e)}")
 
 
+class BatchWriter:
+    """Buffers rows for one table and upserts them in chunks.
+
+    The buffer is flushed once it holds ``max_rows`` rows, ``max_bytes`` of
+    JSON, or its oldest row has waited ``max_interval`` seconds. There is no
+    background timer: the age check runs on ``add``, so call ``flush`` (or
+    use the writer as a context manager) once no more rows are coming. A row
+    whose ``id`` is already buffered replaces the earlier one, since one
+    upsert cannot touch the same key twice.
+
+    Each flush is split into chunks under both limits. A chunk that is too
+    large or has a row Postgres rejects is halved until the bad row is on its
+    own; other failures are retried with backoff and then fail the whole
+    chunk. Rows that fail end up in ``failed``.
+    """
+
+    def __init__(
+        self,
+        supabase_client: SupabaseClient,
+        table_name: str,
+        max_rows: int = 500,
+        max_bytes: int = 4 * 1024 * 1024,
+        max_interval: float = 10.0,
+        max_retries: int = 3,
+        on_flush: Optional[Callable[[List[Dict[Any, Any]]], None]] = None,
+        on_error: Optional[Callable[[Dict[Any, Any], str], None]] = None,
+    ):
+        self.supabase_client = supabase_client
+        self.table_name = table_name
+        self.max_rows = max_rows
+        self.max_bytes = max_bytes
+        self.max_interval = max_interval
+        self.max_retries = max_retries
+        self.on_flush = on_flush
+        self.on_error = on_error
+        self.failed: List[tuple[Dict[Any, Any], str]] = []
+        self.written = 0
+        self.lock = threading.Lock()
+        self._rows: List[tuple[Dict[Any, Any], int]] = []
+        self._positions: Dict[Any, int] = {}
+        self._bytes = 0
+        self._oldest: Optional[float] = None
+
+    def add(self, row: Dict[Any, Any]) -> None:
+        size = len(json.dumps(row))
+        with self.lock:
+            if self._oldest is None:
+                self._oldest = time.monotonic()
+            position = self._positions.get(row.get("id"))
+            if position is None:
+                if row.get("id") is not None:
+                    self._positions[row["id"]] = len(self._rows)
+                self._rows.append((row, size))
+            else:
+                self._bytes -= self._rows[position][1]
+                self._rows[position] = (row, size)
+            self._bytes += size
+            if (
+                len(self._rows) >= self.max_rows
+                or self._bytes >= self.max_bytes
+                or time.monotonic() - self._oldest >= self.max_interval
+            ):
+                self._flush()
+
+    def add_many(self, rows: List[Dict[Any, Any]]) -> None:
+        for row in rows:
+            self.add(row)
+
+    def flush(self) -> None:
+        with self.lock:
+            self._flush()
+
+    def _flush(self) -> None:
+        rows, self._rows = self._rows, []
+        self._positions = {}
+        self._bytes = 0
+        self._oldest = None
+
+        chunk, chunk_bytes = [], 0
+        for row, size in rows:
+            if chunk and (
+                len(chunk) >= self.max_rows or chunk_bytes + size > self.max_bytes
+            ):
+                self._write_chunk(chunk)
+                chunk, chunk_bytes = [], 0
+            chunk.append(row)
+            chunk_bytes += size
+        if chunk:
+            self._write_chunk(chunk)
+
+    def _write_chunk(self, chunk: List[Dict[Any, Any]]) -> None:
+        error = "Not attempted (max_retries is 0)"
+        for attempt in range(self.max_retries):
+            try:
+                self.supabase_client.upsert_embeddings(self.table_name, chunk)
+            except Exception as e:
+                error = str(e)
+                print(f"Chunk of {len(chunk)} rows failed (attempt {attempt + 1}): {e}")
+                # An oversized payload or a bad row will not succeed on retry;
+                # halve the chunk to isolate it
+                if _is_row_error(e.__cause__ or e):
+                    if len(chunk) > 1:
+                        middle = len(chunk) // 2
+                        self._write_chunk(chunk[:middle])
+                        self._write_chunk(chunk[middle:])
+                        return
+                    break
+                if attempt < self.max_retries - 1:
+                    time.sleep(backoff_delay(attempt))
+                continue
+            # Outside the try: a failing callback must not re-send rows that
+            # are already upserted
+            self.written += len(chunk)
+            if self.on_flush:
+                self.on_flush(chunk)
+            return
+
+        for row in chunk:
+            self.failed.append((row, error))
+            if self.on_error:
+                self.on_error(row, error)
+
+    def close(self) -> None:
+        self.flush()
+
+    def __enter__(self) -> "BatchWriter":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
 # client = SupabaseClient()
 # bucket_name = "data"
 # file_path = "csv"
@@ -1,6 +1,13 @@
 import base64
 import code
+import hashlib
 import io
+import json
+import os
+import tempfile
+import time
+from dataclasses import dataclass
+from typing import Optional
 
 import pandas as pd
 import requests
@@ -26,28 +33,224 @@ def get_content_objects(file_content: str, file_extension: str) -> list:
     return content_objects
 
 
-def download_file(url: str) -> tuple[bytes, str]:
-    response = requests.get(url, stream=True)
-    response.raise_for_status()
-    print(f"Downloaded file from {url}")
-    file_extension = url.split(".")[-1].lower()
-    if file_extension not in ["csv", "xlsx"]:
-        raise ValueError(f"Unsupported file type: {file_extension}")
+@dataclass
+class DownloadResult:
+    path: str
+    sha256: str
+    bytes_written: int
+    total_bytes: int
+    resumed_from: int
+    elapsed: float
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    not_modified: bool = False
+
+    @property
+    def throughput_mb_s(self) -> float:
+        return self.bytes_written / (1024 * 1024) / max(self.elapsed, 1e-9)
+
+
+_session: Optional[requests.Session] = None
+
 
-    return response.content, (url.split(".")[-1])
+def http_session() -> requests.Session:
+    """Process-wide session so one-off downloads reuse keep-alive connections."""
+    global _session
+    if _session is None:
+        _session = requests.Session()
+    return _session
 
 
-def download_file_to_local(url: str, save_path: str) -> tuple[bytes, str]:
-    response = requests.get(url, stream=True)
-    response.raise_for_status()
-    print(f"Downloaded file from {url}")
+def file_extension(url: str) -> str:
     file_extension = url.split(".")[-1].lower()
     if file_extension not in ["csv", "xlsx"]:
         raise ValueError(f"Unsupported file type: {file_extension}")
+    return file_extension
 
-    # Save the file locally
-    with open(save_path, "wb") as file:
-        file.write(response.content)
-    print(f"File saved to {save_path}")
 
-    return response.content, file_extension
+def _hash_file(path: str, hasher, chunk_size: int) -> None:
+    with open(path, "rb") as f:
+        while chunk := f.read(chunk_size):
+            hasher.update(chunk)
+
+
+def _read_validators(meta_path: str) -> dict:
+    if not os.path.exists(meta_path):
+        return {}
+    with open(meta_path, "r") as f:
+        return json.load(f)
+
+
+def _if_range(validators: dict) -> Optional[str]:
+    # Weak ETags can't be used with If-Range
+    etag = validators.get("etag")
+    if etag and not etag.startswith("W/"):
+        return etag
+    return validators.get("last_modified")
+
+
+def stream_download(
+    url: str,
+    save_path: str,
+    chunk_size: int = 1024 * 1024,
+    resume: bool = True,
+    session: Optional[requests.Session] = None,
+    timeout: float = 60,
+    report_every: float = 5.0,
+    headers: Optional[dict] = None,
+) -> DownloadResult:
+    """Stream ``url`` to ``save_path`` in fixed-size chunks.
+
+    Data lands in ``<save_path>.part`` and is renamed when complete. If a
+    partial file exists the transfer resumes with an HTTP Range request
+    guarded by ``If-Range``, using the ETag/Last-Modified saved in
+    ``<save_path>.part.json`` when the partial file was started; if the file
+    changed upstream the server sends it whole and the download restarts.
+    Bodies are requested unencoded so ``Content-Length`` and byte offsets
+    match what lands on disk. The SHA-256 is computed on the fly, so memory
+    stays at one chunk regardless of file size. Extra ``headers`` may make
+    the request conditional; a 304 leaves ``save_path`` untouched and returns
+    a result with ``not_modified`` set.
+    """
+    part_path = f"{save_path}.part"
+    meta_path = f"{part_path}.json"
+    hasher = hashlib.sha256()
+    offset = os.path.getsize(part_path) if resume and os.path.exists(part_path) else 0
+    # Content-Length and Range count encoded bytes, so ask for none
+    request_headers = {"Accept-Encoding": "identity", **(headers or {})}
+    if offset:
+        if_range = _if_range(_read_validators(meta_path))
+        if if_range:
+            request_headers["Range"] = f"bytes={offset}-"
+            request_headers["If-Range"] = if_range
+        else:
+            # Without a validator there is no way to tell the partial file
+            # still belongs to the current version
+            offset = 0
+
+    def restart() -> DownloadResult:
+        # Fetch the whole body again once the partial file is discarded
+        return stream_download(
+            url,
+            save_path,
+            chunk_size,
+            resume=False,
+            session=session,
+            timeout=timeout,
+            report_every=report_every,
+            headers=headers,
+        )
+
+    start = time.monotonic()
+    response = (session or http_session()).get(
+        url, stream=True, headers=request_headers, timeout=timeout
+    )
+    etag = response.headers.get("ETag")
+    last_modified = response.headers.get("Last-Modified")
+    with response:
+        if response.status_code == 304:
+            size = os.path.getsize(save_path)
+            return DownloadResult(
+                save_path,
+                "",
+                0,
+                size,
+                0,
+                time.monotonic() - start,
+                etag,
+                last_modified,
+                not_modified=True,
+            )
+        if response.status_code == 416 and offset:
+            # Range starts past the end: the partial file is already complete
+            total = response.headers.get("Content-Range", "").rpartition("/")[2]
+            if total.isdigit() and int(total) == offset:
+                _hash_file(part_path, hasher, chunk_size)
+                os.replace(part_path, save_path)
+                if os.path.exists(meta_path):
+                    os.remove(meta_path)
+                return DownloadResult(
+                    save_path, hasher.hexdigest(), 0, offset, offset, 0.0, etag
+                )
+            # The remote file changed underneath the partial one; start over
+            os.remove(part_path)
+            return restart()
+        response.raise_for_status()
+        encoded = response.headers.get("Content-Encoding", "identity") != "identity"
+        if offset and response.status_code == 206 and encoded:
+            # Encoded ranges don't line up with the decoded partial file
+            response.close()
+            os.remove(part_path)
+            return restart()
+
+        if offset and response.status_code == 206:
+            print(f"Resuming {url} from {offset / (1024 * 1024):.1f} MB")
+            _hash_file(part_path, hasher, chunk_size)
+            mode = "ab"
+        else:
+            offset = 0
+            mode = "wb"
+            with open(meta_path, "w") as f:
+                json.dump({"etag": etag, "last_modified": last_modified}, f)
+        content_length = int(response.headers.get("Content-Length", 0))
+        total_bytes = offset + content_length if content_length else 0
+
+        written = 0
+        last_report = start
+        with open(part_path, mode) as f:
+            for chunk in response.iter_content(chunk_size=chunk_size):
+                f.write(chunk)
+                hasher.update(chunk)
+                written += len(chunk)
+                now = time.monotonic()
+                if now - last_report >= report_every:
+                    last_report = now
+                    rate = written / (1024 * 1024) / (now - start)
+                    done = f"{(offset + written) / (1024 * 1024):.1f}"
+                    if total_bytes:
+                        done += f"/{total_bytes / (1024 * 1024):.1f}"
+                    print(f"Downloading {url}: {done} MB at {rate:.1f} MB/s")
+
+        # A server that encodes anyway reports Content-Length in encoded bytes
+        received = response.raw.tell() if encoded else written
+
+    if content_length and received != content_length:
+        raise IOError(
+            f"Incomplete download of {url}: got {received} of {content_length} bytes"
+        )
+    os.replace(part_path, save_path)
+    if os.path.exists(meta_path):
+        os.remove(meta_path)
+    result = DownloadResult(
+        save_path,
+        hasher.hexdigest(),
+        written,
+        offset + written,
+        offset,
+        time.monotonic() - start,
+        etag,
+        last_modified,
+    )
+    print(
+        f"Downloaded {url} to {save_path}: {result.total_bytes / (1024 * 1024):.1f} MB "
+        f"at {result.throughput_mb_s:.1f} MB/s"
+    )
+    return result
+
+
+def download_file(url: str, save_dir: Optional[str] = None) -> tuple[str, str]:
+    """Download ``url`` into ``save_dir`` (a temp dir by default) and return
+    the local path and file extension. The file is streamed to disk rather
+    than held in memory."""
+    extension = file_extension(url)
+    save_dir = save_dir or tempfile.gettempdir()
+    name = hashlib.sha256(url.encode("utf-8")).hexdigest()[:16]
+    result = stream_download(url, os.path.join(save_dir, f"{name}.{extension}"))
+    return result.path, extension
+
+
+def download_file_to_local(url: str, save_path: str) -> DownloadResult:
+    file_extension(url)
+    result = stream_download(url, save_path)
+    print(f"File saved to {save_path}")
+    return result
@@ -0,0 +1,270 @@
+import json
+import time
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1
+    return vectors / norms
+
+
+def load_rows(path: str) -> List[Dict[str, Any]]:
+    """Read ingested rows from a JSON array or a JSONL results file."""
+    with open(path, "r") as f:
+        if path.endswith(".jsonl"):
+            return [json.loads(line) for line in f if line.strip()]
+        return json.load(f)
+
+
+def top_k(scores: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
+    """Return the indices and scores of the k largest entries of each row."""
+    scores = np.atleast_2d(scores)
+    k = min(k, scores.shape[1])
+    if k == 0:
+        empty = np.empty((scores.shape[0], 0))
+        return empty.astype(np.int64), empty.astype(np.float32)
+    if k < scores.shape[1]:
+        candidates = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    else:
+        candidates = np.broadcast_to(np.arange(scores.shape[1]), scores.shape)
+    candidate_scores = np.take_along_axis(scores, candidates, axis=1)
+    order = np.argsort(-candidate_scores, axis=1)
+    indices = np.take_along_axis(candidates, order, axis=1)
+    return indices, np.take_along_axis(candidate_scores, order, axis=1)
+
+
+class VectorIndex:
+    """Exact cosine-similarity search over an in-memory float32 matrix.
+
+    Rows are normalized once at build time so a query is a single
+    matrix-vector product followed by a partial sort.
+    """
+
+    def __init__(
+        self,
+        ids: List[str],
+        vectors: np.ndarray,
+        metadata: Optional[List[Dict[str, Any]]] = None,
+        normalized: bool = False,
+    ):
+        if len(ids) != len(vectors):
+            raise ValueError(f"Got {len(ids)} ids for {len(vectors)} vectors")
+        self.ids = list(ids)
+        self.vectors = (
+            np.asarray(vectors, dtype=np.float32) if normalized else normalize(vectors)
+        )
+        self.metadata = metadata
+
+    @classmethod
+    def from_rows(
+        cls,
+        rows: List[Dict[str, Any]],
+        field: str = "title_vector",
+        id_field: str = "id",
+    ) -> "VectorIndex":
+        """Build an index from rows shaped like the ``sf_csv_data`` table."""
+        rows = [row for row in rows if row and row.get(field)]
+        vectors = np.array([row[field] for row in rows], dtype=np.float32)
+        ids = [row.get(id_field) or row.get("url") for row in rows]
+        metadata = [
+            {k: v for k, v in row.items() if not k.endswith("_vector")} for row in rows
+        ]
+        return cls(ids, vectors, metadata)
+
+    @classmethod
+    def from_json(cls, json_file_path: str, field: str = "title_vector"):
+        return cls.from_rows(load_rows(json_file_path), field=field)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def dim(self) -> int:
+        return self.vectors.shape[1]
+
+    def search(self, query, k: int = 10) -> List[tuple[str, float]]:
+        return self.search_batch([query], k)[0]
+
+    def search_batch(self, queries, k: int = 10) -> List[List[tuple[str, float]]]:
+        """Return the ``k`` most similar ids and their cosine similarity per query."""
+        scores = normalize(np.atleast_2d(queries)) @ self.vectors.T
+        indices, top_scores = top_k(scores, k)
+        return [
+            [(self.ids[i], float(s)) for i, s in zip(row_indices, row_scores)]
+            for row_indices, row_scores in zip(indices, top_scores)
+        ]
+
+
+def _assign(vectors: np.ndarray, centroids: np.ndarray, chunk_size: int = 8192):
+    assignments = np.empty(len(vectors), dtype=np.int64)
+    for start in range(0, len(vectors), chunk_size):
+        scores = vectors[start : start + chunk_size] @ centroids.T
+        assignments[start : start + chunk_size] = np.argmax(scores, axis=1)
+    return assignments
+
+
+def spherical_kmeans(
+    vectors: np.ndarray, n_clusters: int, n_iter: int = 20, seed: int = 0
+) -> np.ndarray:
+    """Cluster normalized vectors by cosine similarity and return unit centroids."""
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), n_clusters, replace=False)].copy()
+    for _ in range(n_iter):
+        assignments = _assign(vectors, centroids)
+        order = np.argsort(assignments, kind="stable")
+        counts = np.bincount(assignments, minlength=n_clusters)
+        non_empty = np.flatnonzero(counts)
+        starts = np.concatenate([[0], np.cumsum(counts)[:-1]])[non_empty]
+        centroids[non_empty] = normalize(np.add.reduceat(vectors[order], starts))
+        empty = np.flatnonzero(counts == 0)
+        if len(empty):
+            centroids[empty] = vectors[rng.choice(len(vectors), len(empty))]
+    return centroids
+
+
+class IVFFlatIndex:
+    """Approximate cosine search with an inverted file over k-means cells.
+
+    ``n_lists`` controls how finely the corpus is partitioned and ``n_probe``
+    how many cells are scanned per query; raising ``n_probe`` trades latency
+    for recall, and ``n_probe == n_lists`` is an exact scan.
+    """
+
+    def __init__(
+        self,
+        ids: List[str],
+        vectors: np.ndarray,
+        n_lists: Optional[int] = None,
+        n_probe: int = 8,
+        n_iter: int = 20,
+        train_size: int = 50_000,
+        seed: int = 0,
+        normalized: bool = False,
+    ):
+        vectors = (
+            np.asarray(vectors, dtype=np.float32) if normalized else normalize(vectors)
+        )
+        if n_lists is None:
+            n_lists = max(1, int(4 * np.sqrt(len(vectors))))
+        n_lists = min(n_lists, len(vectors))
+        self.n_probe = n_probe
+
+        rng = np.random.default_rng(seed)
+        sample = vectors
+        if len(vectors) > train_size:
+            sample = vectors[rng.choice(len(vectors), train_size, replace=False)]
+        self.centroids = spherical_kmeans(sample, n_lists, n_iter=n_iter, seed=seed)
+
+        # Store rows grouped by cell so each cell is a contiguous slice
+        assignments = _assign(vectors, self.centroids)
+        order = np.argsort(assignments, kind="stable")
+        self.vectors = vectors[order]
+        self.ids = [ids[i] for i in order]
+        self.offsets = np.concatenate(
+            [[0], np.cumsum(np.bincount(assignments, minlength=n_lists))]
+        )
+
+    @property
+    def n_lists(self) -> int:
+        return len(self.centroids)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def search(self, query, k: int = 10, n_probe: Optional[int] = None):
+        return self.search_batch([query], k, n_probe)[0]
+
+    def search_batch(
+        self, queries, k: int = 10, n_probe: Optional[int] = None
+    ) -> List[List[tuple[str, float]]]:
+        n_probe = min(n_probe or self.n_probe, self.n_lists)
+        queries = normalize(np.atleast_2d(queries))
+        probes, _ = top_k(queries @ self.centroids.T, n_probe)
+
+        results = []
+        for query, cells in zip(queries, probes):
+            rows = np.concatenate(
+                [np.arange(self.offsets[c], self.offsets[c + 1]) for c in cells]
+            )
+            indices, scores = top_k(self.vectors[rows] @ query, k)
+            results.append(
+                [(self.ids[rows[i]], float(s)) for i, s in zip(indices[0], scores[0])]
+            )
+        return results
+
+    @staticmethod
+    def _npz_path(path: str) -> str:
+        # np.savez appends .npz when missing; load has to look for the same file
+        return path if path.endswith(".npz") else f"{path}.npz"
+
+    def save(self, path: str) -> None:
+        np.savez(
+            self._npz_path(path),
+            vectors=self.vectors,
+            centroids=self.centroids,
+            offsets=self.offsets,
+            # A fixed-width string array loads without allow_pickle
+            ids=np.array(self.ids, dtype=str),
+            n_probe=self.n_probe,
+        )
+
+    @classmethod
+    def load(cls, path: str) -> "IVFFlatIndex":
+        data = np.load(cls._npz_path(path))
+        index = cls.__new__(cls)
+        index.vectors = data["vectors"]
+        index.centroids = data["centroids"]
+        index.offsets = data["offsets"]
+        index.ids = data["ids"].astype(str).tolist()
+        index.n_probe = int(data["n_probe"])
+        return index
+
+
+def recall_at_k(approximate, exact, k: int = 10) -> float:
+    """Mean fraction of the exact top-k ids that the approximate search found."""
+    hits = 0
+    for approx_row, exact_row in zip(approximate, exact):
+        expected = {i for i, _ in exact_row[:k]}
+        hits += len(expected & {i for i, _ in approx_row[:k]})
+    return hits / (k * len(exact))
+
+
+def evaluate_recall(index, exact: VectorIndex, queries, k: int = 10, **search_kwargs):
+    start = time.perf_counter()
+    approximate = index.search_batch(queries, k, **search_kwargs)
+    latency_ms = (time.perf_counter() - start) * 1000 / len(queries)
+    recall = recall_at_k(approximate, exact.search_batch(queries, k), k)
+    return {"recall": recall, "latency_ms": latency_ms}
+
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) > 1:
+        exact_index = VectorIndex.from_json(sys.argv[1])
+        ids, vectors = exact_index.ids, exact_index.vectors
+    else:
+        # Clustered synthetic corpus roughly shaped like voyage-3 output
+        rng = np.random.default_rng(0)
+        centers = rng.normal(size=(200, 1024)).astype(np.float32)
+        vectors = centers[rng.integers(0, 200, 50_000)] + rng.normal(
+            scale=0.6, size=(50_000, 1024)
+        ).astype(np.float32)
+        ids = [str(i) for i in range(len(vectors))]
+        exact_index = VectorIndex(ids, vectors)
+
+    queries = exact_index.vectors[
+        np.random.default_rng(1).choice(len(ids), min(200, len(ids)), replace=False)
+    ]
+    ivf_index = IVFFlatIndex(ids, exact_index.vectors, normalized=True)
+    print(f"IVF index: {len(ivf_index)} vectors in {ivf_index.n_lists} lists")
+    for n_probe in (1, 4, 8, 16, 32):
+        report = evaluate_recall(ivf_index, exact_index, queries, n_probe=n_probe)
+        print(
+            f"n_probe={n_probe}: recall@10={report['recall']:.3f} "
+            f"latency={report['latency_ms']:.2f}ms"
+        )
@@ -1,8 +1,12 @@
 import logging
+import os
+from typing import Optional
 
 import numpy as np
 import voyageai
 from dotenv import load_dotenv
+from scraper.utils.embedding_cache import DEFAULT_CACHE_PATH, EmbeddingCache
+from scraper.utils.rate_limit import acall_with_backoff, call_with_backoff
 from scraper.utils.supabase_client import SupabaseClient
 
 # Configure logging
@@ -10,20 +14,138 @@ logging.basicConfig(level=logging.INFO)
 
 load_dotenv()
 vo = voyageai.Client()
+avo = voyageai.AsyncClient()
 supabase_client = SupabaseClient()
+embedding_cache = EmbeddingCache(os.getenv("EMBEDDING_CACHE_PATH", DEFAULT_CACHE_PATH))
+
+
+EMBEDDING_MODEL = "voyage-3"
+# voyage-3 accepts at most 128 texts and 120K tokens per request.
+MAX_BATCH_SIZE = 128
+MAX_BATCH_TOKENS = 120_000
+
+
+def estimate_tokens(text: str) -> int:
+    # Deliberately pessimistic (~3 chars per token) so batches stay under the
+    # provider limit without shipping the Voyage tokenizer.
+    return len(text) // 3 + 1
+
+
+def batch_texts(
+    texts: list[str],
+    max_batch_size: int = MAX_BATCH_SIZE,
+    max_batch_tokens: int = MAX_BATCH_TOKENS,
+) -> list[list[int]]:
+    """Group text indices into batches that respect the per-request limits."""
+    batches = []
+    current = []
+    current_tokens = 0
+    for i, text in enumerate(texts):
+        tokens = estimate_tokens(text)
+        if current and (
+            len(current) >= max_batch_size or current_tokens + tokens > max_batch_tokens
+        ):
+            batches.append(current)
+            current = []
+            current_tokens = 0
+        current.append(i)
+        current_tokens += tokens
+    if current:
+        batches.append(current)
+    return batches
+
+
+def is_embeddable(text: str) -> bool:
+    return bool(text and text.strip())
+
+
+def _split_cached(
+    texts: list[str], model: str, input_type: str, use_cache: bool
+) -> tuple[list, list[str]]:
+    """Fill in cached embeddings and return the distinct texts still missing.
+
+    Blank texts are left out: Voyage rejects them, failing the whole request.
+    """
+    embeddings = [None] * len(texts)
+    if use_cache:
+        for i, embedding in embedding_cache.get_many(texts, model, input_type).items():
+            embeddings[i] = embedding
+    missing = list(
+        dict.fromkeys(
+            t for t, e in zip(texts, embeddings) if e is None and is_embeddable(t)
+        )
+    )
+    if missing:
+        cached = sum(e is not None for e in embeddings)
+        logging.info(f"Generating {len(missing)} embeddings ({cached} cached)")
+    elif all(e is not None for e in embeddings):
+        logging.info(f"All {len(texts)} embeddings served from cache")
+    return embeddings, missing
+
+
+def _merge_generated(
+    texts: list[str], embeddings: list, generated: dict[str, list[float]]
+) -> list[list[float]]:
+    for i, text in enumerate(texts):
+        if embeddings[i] is None:
+            embeddings[i] = generated.get(text)
+    return embeddings
+
+
+def get_embeddings(
+    texts: list[str],
+    input_type: str = "document",
+    model: str = EMBEDDING_MODEL,
+    use_cache: bool = True,
+) -> list[Optional[list[float]]]:
+    """Embed ``texts`` in provider-sized batches, reusing cached embeddings.
+
+    Blank texts are not sent and get ``None``, so callers can fail just the
+    entries they belong to.
+    """
+    embeddings, missing = _split_cached(texts, model, input_type, use_cache)
+    generated = {}
+    for batch in batch_texts(missing):
+        chunk = [missing[i] for i in batch]
+        result = call_with_backoff(
+            "voyage", vo.embed, chunk, model=model, input_type=input_type
+        )
+        generated.update(zip(chunk, result.embeddings))
+        if use_cache:
+            embedding_cache.put_many(chunk, result.embeddings, model, input_type)
+    return _merge_generated(texts, embeddings, generated)
+
+
+async def aget_embeddings(
+    texts: list[str],
+    input_type: str = "document",
+    model: str = EMBEDDING_MODEL,
+    use_cache: bool = True,
+) -> list[Optional[list[float]]]:
+    embeddings, missing = _split_cached(texts, model, input_type, use_cache)
+    generated = {}
+    for batch in batch_texts(missing):
+        chunk = [missing[i] for i in batch]
+        result = await acall_with_backoff(
+            "voyage", avo.embed, chunk, model=model, input_type=input_type
+        )
+        generated.update(zip(chunk, result.embeddings))
+        if use_cache:
+            embedding_cache.put_many(chunk, result.embeddings, model, input_type)
+    return _merge_generated(texts, embeddings, generated)
 
 
 def get_embedding(text: str) -> list[float]:
     logging.info(f"Generating embedding for text: {text}")
-    result = vo.embed([text], model="voyage-3", input_type="document")
-    embedding = result.embeddings[0]
+    embedding = get_embeddings([text])[0]
+    if embedding is None:
+        raise ValueError("Cannot embed empty text")
     logging.info(f"Generated embedding: {len(embedding)}")
     return embedding
 
 
 def query_embeddings(query: str, n: int = 10) -> list[list[float]]:
-    result = vo.embed([query], model="voyage-3", input_type="query")
-    return result.embeddings
+    return get_embeddings([query], input_type="query")
 
 
 def cosine_distance(embedding1: list[float], embedding2: list[float]) -> float:
@@ -0,0 +1,38 @@
+import pyarrow as pa
+import pyarrow.parquet as pq
+from scraper.utils.parquet import convert_to_parquet
+
+
+def write_csv(path, header, rows):
+    path.write_text("\n".join([header] + rows) + "\n")
+    return str(path)
+
+
+def test_multiline_cells_across_blocks(tmp_path):
+    rows = [
+        f'{i},"line one of {i}\nline two of {i}\nline three",{i * 1.5}'
+        for i in range(2000)
+    ]
+    src = write_csv(tmp_path / "data.csv", "id,description,value", rows)
+
+    dest = convert_to_parquet(src, block_size=4096)
+
+    table = pq.read_table(dest)
+    assert table.num_rows == 2000
+    assert table.column("description")[1999].as_py() == (
+        "line one of 1999\nline two of 1999\nline three"
+    )
+
+
+def test_column_that_changes_type_is_stored_as_string(tmp_path):
+    rows = [f"{i},{94100 + i % 50}" for i in range(5000)] + ["5000,SW1A 1AA"]
+    src = write_csv(tmp_path / "data.csv", "id,zip", rows)
+
+    dest = convert_to_parquet(src, block_size=4096)
+
+    table = pq.read_table(dest)
+    assert table.num_rows == 5001
+    assert table.schema.field("id").type == pa.int64()
+    assert table.schema.field("zip").type == pa.string()
+    assert table.column("zip")[0].as_py() == "94100"
+    assert table.column("zip")[5000].as_py() == "SW1A 1AA"
@@ -0,0 +1,151 @@
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+from scraper.utils import resumable_upload
+from scraper.utils.resumable_upload import ResumableUploader
+
+
+class TusServer(ThreadingHTTPServer):
+    """Stand-in for Supabase Storage's TUS endpoint.
+
+    ``fail_patches`` PATCH requests fail with a 500 after storing the first
+    ``partial`` bytes of their chunk; ``fail_heads`` HEAD requests drop the
+    connection.
+    """
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), TusHandler)
+        self.uploads: dict[str, bytearray] = {}
+        self.fail_patches = 0
+        self.fail_heads = 0
+        self.partial = 1000
+
+
+class TusHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def _upload_id(self) -> str:
+        return self.path.rsplit("/", 1)[-1]
+
+    def do_POST(self):
+        upload_id = str(len(self.server.uploads))
+        self.server.uploads[upload_id] = bytearray()
+        self.send_response(201)
+        self.send_header("Location", f"/upload/resumable/{upload_id}")
+        self.end_headers()
+
+    def do_HEAD(self):
+        if self.server.fail_heads:
+            self.server.fail_heads -= 1
+            self.close_connection = True
+            return
+        data = self.server.uploads.get(self._upload_id())
+        if data is None:
+            self.send_response(404)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Upload-Offset", str(len(data)))
+        self.end_headers()
+
+    def do_PATCH(self):
+        data = self.server.uploads[self._upload_id()]
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        if int(self.headers["Upload-Offset"]) != len(data):
+            self.send_response(409)
+            self.end_headers()
+            return
+        if data and self.server.fail_patches:
+            self.server.fail_patches -= 1
+            data += body[: self.server.partial]
+            self.send_response(500)
+            self.end_headers()
+            return
+        data += body
+        self.send_response(204)
+        self.send_header("Upload-Offset", str(len(data)))
+        self.end_headers()
+
+
+@pytest.fixture
+def server():
+    server = TusServer()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def uploader(server, tmp_path, monkeypatch):
+    monkeypatch.setattr(resumable_upload, "backoff_delay", lambda attempt: 0)
+    return ResumableUploader(
+        f"http://127.0.0.1:{server.server_port}/upload/resumable",
+        "key",
+        state_dir=str(tmp_path / "state"),
+        chunk_size=1_000_000,
+        max_retries=3,
+        timeout=5,
+    )
+
+
+@pytest.fixture
+def data_file(tmp_path):
+    data = os.urandom(3_500_000)
+    path = tmp_path / "data.csv"
+    path.write_bytes(data)
+    return str(path), data
+
+
+def test_upload_sends_file_in_chunks(server, uploader, data_file):
+    path, data = data_file
+
+    assert uploader.upload("data", path, "csv/data.csv") == "csv/data.csv"
+    assert bytes(server.uploads["0"]) == data
+    assert os.listdir(uploader.state_dir) == []
+
+
+def test_failed_chunk_continues_from_server_offset(server, uploader, data_file):
+    path, data = data_file
+    server.fail_patches = 1
+
+    uploader.upload("data", path, "csv/data.csv")
+
+    assert bytes(server.uploads["0"]) == data
+
+
+def test_failed_offset_check_is_retried(server, uploader, data_file):
+    path, data = data_file
+    server.fail_patches = 1
+    server.fail_heads = 1
+
+    uploader.upload("data", path, "csv/data.csv")
+
+    assert bytes(server.uploads["0"]) == data
+
+
+def test_gives_up_after_max_retries(server, uploader, data_file):
+    path, _ = data_file
+    server.fail_patches = 1
+    server.fail_heads = uploader.max_retries - 1
+
+    with pytest.raises(requests.RequestException):
+        uploader.upload("data", path, "csv/data.csv")
+
+
+def test_rerun_resumes_saved_upload(server, uploader, data_file):
+    path, data = data_file
+    server.fail_patches = 1
+    server.fail_heads = uploader.max_retries - 1
+    with pytest.raises(requests.RequestException):
+        uploader.upload("data", path, "csv/data.csv")
+
+    uploader.upload("data", path, "csv/data.csv")
+
+    assert list(server.uploads) == ["0"]
+    assert bytes(server.uploads["0"]) == data